@@ -0,0 +1,115 @@
+"""
+    Run the benchmark scenarios on every board and save the results as JSON, e.g.
+
+        python -m benchmarks.run --output results.json --baseline previous.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import traceback
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCHMARKS_DIRECTORY))
+
+from benchmarks.scenarios import SCENARIOS
+from pacman.maze_generator import write_maze
+
+DEFAULT_SYNTHETIC_SIZES = ['32x32', '64x64']
+SYNTHETIC_LOOP_DENSITY = 0.2
+SYNTHETIC_GHOSTS = 4
+SYNTHETIC_SEED = 0
+
+
+def get_boards(synthetic_sizes, directory):
+    boards = sorted(os.path.splitext(os.path.basename(path))[0]
+                    for path in glob.glob(os.path.join(BENCHMARKS_DIRECTORY, '..', 'boards', 'level-*.txt')))
+    for size in synthetic_sizes:
+        width, height = (int(side) for side in size.split('x'))
+        path = os.path.join(directory, 'maze-%dx%d.txt' % (width, height))
+        boards.append(write_maze(path, width, height, SYNTHETIC_LOOP_DENSITY, SYNTHETIC_GHOSTS, SYNTHETIC_SEED))
+    return boards
+
+
+def get_board_name(board):
+    return os.path.splitext(os.path.basename(board))[0]
+
+
+def run_benchmarks(scenarios, boards, duration):
+    results = []
+    for scenario in scenarios:
+        for board in boards:
+            result = {'scenario': scenario, 'board': get_board_name(board)}
+            try:
+                result['metrics'] = SCENARIOS[scenario](board, duration)
+            except Exception:
+                # e.g. a board without Pac-Man. Keep going with the other boards
+                result['error'] = traceback.format_exc(limit=1).strip().splitlines()[-1]
+            print(json.dumps(result))
+            results.append(result)
+    return results
+
+
+def is_regression(metric, ratio, tolerance):
+    # Latencies should go down, everything else up
+    if metric.endswith('_us'):
+        return ratio > 1 + tolerance
+    return ratio < 1 - tolerance
+
+
+def compare_results(results, baseline, tolerance):
+    """
+        Print how every metric changed against a baseline run
+    Returns:
+        Number of metrics that got worse by more than the tolerance
+    """
+    baseline_metrics = {(result['scenario'], result['board']): result.get('metrics', {})
+                        for result in baseline['results']}
+    regressions = 0
+    for result in results:
+        previous = baseline_metrics.get((result['scenario'], result['board']), {})
+        for metric, value in result.get('metrics', {}).items():
+            if not previous.get(metric):
+                continue
+            ratio = value / previous[metric]
+            regressed = is_regression(metric, ratio, tolerance)
+            regressions += regressed
+            print('%-20s %-20s %-32s %12.2f -> %12.2f (%5.2fx)%s' % (
+                result['scenario'], result['board'], metric, previous[metric], value, ratio,
+                '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pac-Man performance benchmarks')
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument('--synthetic', nargs='*', default=DEFAULT_SYNTHETIC_SIZES,
+                        help='sizes of generated mazes, as WIDTHxHEIGHT')
+    parser.add_argument('--duration', type=float, default=1.0, help='seconds spent on every scenario and board')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change reported as a regression')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        boards = get_boards(args.synthetic, directory)
+        results = run_benchmarks(args.scenarios, boards, args.duration)
+
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'machine': platform.machine(), 'duration': args.duration, 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results saved to %s' % args.output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from pacman.actions import Action
+from pacman.simulation import Simulation
+from qlearning.q_learning import QLearn
+from qlearning.q_table import DenseQTable, MappedQTable, save_q_table
+
+MOVES = ["UP", "RIGHT", "DOWN", "LEFT"]
+
+
+def run_for(duration, step):
+    """
+        Call step until duration seconds have passed
+    Returns:
+        (number of calls, elapsed seconds)
+    """
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < duration:
+        step()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return calls, elapsed
+
+
+def benchmark_simulation_steps(level, duration):
+    simulation = Simulation(level)
+    rng = random.Random(0)
+
+    def step():
+        game_state, action_event, episode_done = simulation.step(rng.choice(MOVES))
+        if episode_done:
+            simulation.reset()
+
+    steps, elapsed = run_for(duration, step)
+    return {'steps_per_second': steps / elapsed}
+
+
+def benchmark_training_episodes(level, duration, max_steps_per_episode=2000):
+    simulation = Simulation(level)
+    q_model = QLearn()
+    random.seed(0)
+    np.random.seed(0)
+    # Steps over all episodes and steps of the current one
+    steps = [0, 0]
+    original_reset = simulation.reset
+    original_step = simulation.step
+
+    def reset(seed=None):
+        steps[1] = 0
+        return original_reset(seed)
+
+    def limited_step(move):
+        # Random play on large boards can take very long to end, so cut episodes short
+        game_state, action_event, episode_done = original_step(move)
+        steps[0] += 1
+        steps[1] += 1
+        return game_state, action_event, episode_done or steps[1] >= max_steps_per_episode
+
+    simulation.reset = reset
+    simulation.step = limited_step
+    episodes, elapsed = run_for(duration, lambda: q_model.run_episode(simulation))
+    return {'episodes_per_second': episodes / elapsed,
+            'training_steps_per_second': steps[0] / elapsed,
+            'q_table_states': len(q_model.q_table)}
+
+
+def benchmark_q_table_lookups(level, duration, num_states=2000):
+    simulation = Simulation(level)
+    rng = random.Random(0)
+    states = []
+    game_state = simulation.reset()
+    while len(states) < num_states:
+        game_state, action_event, episode_done = simulation.step(rng.choice(MOVES))
+        states.append(game_state)
+        if episode_done:
+            game_state = simulation.reset()
+
+    q_table = DenseQTable()
+    for state in states:
+        q_table.update(state, Action.UP, rng.random())
+
+    def lookup_all(table):
+        for state in states:
+            table.get_max_value(state)
+
+    metrics = {'q_table_states': len(q_table)}
+    calls, elapsed = run_for(duration / 2, lambda: lookup_all(q_table))
+    metrics['dense_lookup_us'] = elapsed / (calls * len(states)) * 1e6
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'q_table')
+        save_q_table(path, q_table, feedback=False)
+        mapped_table = MappedQTable(path)
+        calls, elapsed = run_for(duration / 2, lambda: lookup_all(mapped_table))
+        metrics['mapped_lookup_us'] = elapsed / (calls * len(states)) * 1e6
+        del mapped_table
+    return metrics
+
+
+def benchmark_rendering(level, duration, num_states=500):
+    # Render into an off-screen surface
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    import graphics.draw_board as draw_board
+
+    pygame.init()
+    screen = pygame.display.set_mode((760, 840))
+    # Frames of a game played beforehand, so every frame differs from the previous one like in a real game and
+    # only drawing is timed
+    simulation = Simulation(level)
+    rng = random.Random(0)
+    game_states = [simulation.reset()]
+    while len(game_states) < num_states:
+        game_state, action_event, episode_done = simulation.step(rng.choice(MOVES))
+        game_states.append(simulation.reset() if episode_done else game_state)
+    frame = [0]
+
+    def next_game_state():
+        frame[0] += 1
+        return game_states[frame[0] % len(game_states)]
+
+    def draw_frame():
+        game_state = next_game_state()
+        screen.fill((1, 1, 1))
+        draw_board.draw_board(game_state, screen)
+        draw_board.draw_lives(game_state, screen)
+        draw_board.draw_score(game_state, screen)
+
+    renderer = draw_board.BoardRenderer(screen)
+    board_frames, board_elapsed = run_for(duration / 3, lambda: draw_board.draw_board(next_game_state(), screen))
+    frames, elapsed = run_for(duration / 3, draw_frame)
+    dirty_frames, dirty_elapsed = run_for(duration / 3, lambda: renderer.draw(next_game_state()))
+    return {'draw_board_frames_per_second': board_frames / board_elapsed,
+            'full_frame_frames_per_second': frames / elapsed,
+            'dirty_rect_frames_per_second': dirty_frames / dirty_elapsed}
+
+
+SCENARIOS = {
+    'simulation_steps': benchmark_simulation_steps,
+    'training_episodes': benchmark_training_episodes,
+    'q_table_lookups': benchmark_q_table_lookups,
+    'rendering': benchmark_rendering,
+}
@@ -3,9 +3,11 @@ import pygame
 import time
 from objects.pacman import Pacman
 from objects.ghost import Ghost
+from graphics.hud import Hud
 
 image_size = 40
-font_name = "arial"
+background_color = (1, 1, 1)
+default_hud = Hud()
 
 
 def translate_position_to_pixels(position):
@@ -14,12 +16,11 @@ def translate_position_to_pixels(position):
 
 def draw_item(item, screen):
     if type(item) == Pacman:
-        animate_item(item, screen, 0.1, item.current_move == "LEFT")
+        return animate_item(item, screen, 0.1, item.current_move == "LEFT")
     elif type(item) == Ghost:
-        animate_item(item, screen, 0.1, item.previous_move == "LEFT")
+        return animate_item(item, screen, 0.1, item.previous_move == "LEFT")
     else:
-        screen.blit(load.get_image('../images/' + item.get_icon()),
-                    translate_position_to_pixels(item.get_position()))
+        return screen.blit(load.get_sprite(item.get_icon()), translate_position_to_pixels(item.get_position()))
 
 
 def animate_item(item, screen, animation_delta, flipped):
@@ -33,29 +34,109 @@ def animate_item(item, screen, animation_delta, flipped):
     pixel_position = translate_position_to_pixels(item.get_position())
     pixel_position_offset = pixel_position[0] - direction_offset[0], pixel_position[1] - direction_offset[1]
 
-    image = load.get_image('../images/' + item.get_icon(), force_reload=type(item) == Ghost)
-    if flipped:
-            image = pygame.transform.flip(image, True, False)
-
-    screen.blit(image, pixel_position_offset)
+    image = load.get_sprite(item.get_icon(), flipped)
+    return screen.blit(image, pixel_position_offset)
 
 
 def draw_score(gamestate, screen):
-    score = gamestate.calculate_score()
-    font = pygame.font.SysFont(font_name, 72)
-    text = font.render("Score: " + str(score), True, (0, 128, 0))
-    w, h = pygame.display.get_surface().get_size()
-    screen.blit(text, (0, h - text.get_height()))
+    return default_hud.draw_score(gamestate, screen)
 
 
 def draw_lives(gamestate, screen):
-    lives = gamestate.pacman.lives
-    font = pygame.font.SysFont(font_name, 72)
-    text = font.render("Lives: " + str(lives), True, (0, 128, 0))
-    w, h = pygame.display.get_surface().get_size()
-    screen.blit(text, (w - text.get_width(), h - text.get_height()))
+    return default_hud.draw_lives(gamestate, screen)
 
 
 def draw_board(gamestate, screen):
     for item in gamestate.retrieve_all_active_items():
         draw_item(item, screen)
+
+
+class BoardRenderer:
+    """
+        Draws a game onto the screen while only touching what changed since the previous frame.
+
+        The walls are drawn once into a background surface and the dots into a copy of it, the dot layer.
+        A dot that is eaten is wiped from the dot layer by copying its cell back from the background. Every
+        frame only the cells the moving sprites covered in the previous frame are restored from the dot layer,
+        the sprites are drawn at their new place and the HUD is redrawn if the score or lives changed.
+    """
+
+    def __init__(self, screen, hud=None):
+        self.screen = screen
+        self.hud = hud if hud is not None else default_hud
+        self.background = None
+        self.dot_layer = None
+        self.wall_index = None
+        self.dot_mask = 0
+        # Screen areas of the sprites and the HUD drawn in the previous frame
+        self.sprite_rects = []
+        self.hud_rects = []
+        self.hud_values = None
+
+    def build_layers(self, gamestate):
+        self.background = pygame.Surface(self.screen.get_size()).convert()
+        self.background.fill(background_color)
+        for wall in gamestate.walls:
+            draw_item(wall, self.background)
+        self.dot_layer = self.background.copy()
+        for dot in gamestate.iter_active_dots():
+            draw_item(dot, self.dot_layer)
+        self.wall_index = gamestate.wall_index
+        self.dot_mask = gamestate.dot_mask
+
+    def update_dot_layer(self, gamestate):
+        """
+            Wipe the dots eaten since the previous frame from the dot layer
+        Returns:
+            List of the screen areas that changed
+        """
+        eaten = self.dot_mask & ~gamestate.dot_mask
+        rects = []
+        while eaten:
+            lowest_bit = eaten & -eaten
+            dot = gamestate.dots[lowest_bit.bit_length() - 1]
+            rect = pygame.Rect(translate_position_to_pixels(dot.position), (image_size, image_size))
+            self.dot_layer.blit(self.background, rect, rect)
+            rects.append(rect)
+            eaten ^= lowest_bit
+        self.dot_mask = gamestate.dot_mask
+        return rects
+
+    def restore(self, rects):
+        for rect in rects:
+            self.screen.blit(self.dot_layer, rect, rect)
+
+    def draw(self, gamestate):
+        """
+            Draw the current game state
+        Returns:
+            List of the screen areas that changed, to pass to pygame.display.update
+        """
+        # A new board, or dots that came back after a reset, need the layers to be drawn again
+        if self.wall_index is not gamestate.wall_index or gamestate.dot_mask & ~self.dot_mask:
+            self.build_layers(gamestate)
+            self.screen.blit(self.dot_layer, (0, 0))
+            self.sprite_rects = []
+            self.hud_rects = []
+            self.hud_values = None
+            dirty_rects = [self.screen.get_rect()]
+        else:
+            dirty_rects = self.update_dot_layer(gamestate)
+            self.restore(dirty_rects)
+
+        hud_values = (gamestate.calculate_score(), gamestate.pacman.lives)
+        hud_changed = hud_values != self.hud_values
+        if hud_changed:
+            self.restore(self.hud_rects)
+            dirty_rects.extend(self.hud_rects)
+        self.restore(self.sprite_rects)
+        dirty_rects.extend(self.sprite_rects)
+
+        self.sprite_rects = [draw_item(agent, self.screen)
+                             for agent in list(gamestate.ghosts) + [gamestate.pacman]]
+        dirty_rects.extend(self.sprite_rects)
+        if hud_changed:
+            self.hud_rects = [self.hud.draw_lives(gamestate, self.screen), self.hud.draw_score(gamestate, self.screen)]
+            dirty_rects.extend(self.hud_rects)
+            self.hud_values = hud_values
+        return dirty_rects
@@ -0,0 +1,51 @@
+from collections import OrderedDict
+
+import pygame
+
+FONT_NAME = "arial"
+FONT_SIZE = 72
+TEXT_COLOR = (0, 128, 0)
+TEXT_CACHE_SIZE = 256
+
+
+class Hud:
+    """
+        Score and lives display. The font is created once and every rendered text is kept by its value, so a
+        frame in which the score and lives did not change renders no text at all.
+    """
+
+    def __init__(self, font_name=FONT_NAME, font_size=FONT_SIZE, color=TEXT_COLOR, cache_size=TEXT_CACHE_SIZE):
+        self.font_name = font_name
+        self.font_size = font_size
+        self.color = color
+        self.cache_size = cache_size
+        self.font = None
+        # text -> rendered Surface, least recently used first
+        self.text_cache = OrderedDict()
+
+    def get_font(self):
+        if self.font is None:
+            # The font module has to be initialised, which pygame.init does
+            self.font = pygame.font.SysFont(self.font_name, self.font_size)
+        return self.font
+
+    def render_text(self, text):
+        surface = self.text_cache.get(text)
+        if surface is None:
+            surface = self.get_font().render(text, True, self.color)
+            self.text_cache[text] = surface
+            if len(self.text_cache) > self.cache_size:
+                self.text_cache.popitem(last=False)
+        else:
+            self.text_cache.move_to_end(text)
+        return surface
+
+    def draw_score(self, gamestate, screen):
+        text = self.render_text("Score: " + str(gamestate.calculate_score()))
+        w, h = screen.get_size()
+        return screen.blit(text, (0, h - text.get_height()))
+
+    def draw_lives(self, gamestate, screen):
+        text = self.render_text("Lives: " + str(gamestate.pacman.lives))
+        w, h = screen.get_size()
+        return screen.blit(text, (w - text.get_width(), h - text.get_height()))
@@ -20,10 +20,14 @@ class Existence:
     def get_symbol(self):
         return self.symbol
 
+    def set_position(self, position):
+        # Let the game state keep its hash in sync with the new position
+        self.gamestate.move_agent(self, position)
+
     def move(self, direction):
         self.previous_position = self.position
         if self.is_move_valid(direction):
-            self.position = self.position[0] + direction[0], self.position[1] + direction[1]
+            self.set_position((self.position[0] + direction[0], self.position[1] + direction[1]))
             return True
         else:
             return False
@@ -31,7 +35,7 @@ class Existence:
     def is_move_valid(self, direction):
         old_position = self.position
         attempted_new_position = gamelogic.add_move_to_position(old_position, direction)
-        return not gamelogic.is_wall(self.gamestate, attempted_new_position)
+        return not self.gamestate.is_wall(attempted_new_position)
 
 
 
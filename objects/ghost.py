@@ -1,4 +1,5 @@
 from objects.existence import Existence
+from pacman.clock import build_phase_table, get_phase
 import utils.moves as moves
 import random
 import time
@@ -9,6 +10,10 @@ CHASE = 'CHASE'
 SCATTER = 'SCATTER'
 FRIGHTENED_DURATION = 5
 
+# Mode of a ghost for every tick since it respawned
+MODE_PHASE_TABLE = build_phase_table(SCATTER, [(7000, CHASE), (27000, SCATTER), (34000, CHASE), (54000, SCATTER),
+                                               (59000, CHASE), (79000, SCATTER), (84000, CHASE)])
+
 
 class Ghost(Existence):
     def __init__(self, position, gamestate):
@@ -18,70 +23,22 @@ class Ghost(Existence):
         self.target_position = (3, 3)
         self.mode = CHASE
         self.previous_move = None
-        self.time_at_respawn = time.time()
+        self.ticks_since_respawn = 0
+        # Only used to animate the ghost
         self.time_at_last_tick = time.time()
 
     def ghost_event_routine(self):
-        if time.time() - self.time_at_respawn > 84:
-            return CHASE
-        if time.time() - self.time_at_respawn > 79:
-            return SCATTER
-        if time.time() - self.time_at_respawn > 59:
-            return CHASE
-        if time.time() - self.time_at_respawn > 54:
-            return SCATTER
-        if time.time() - self.time_at_respawn > 34:
-            return CHASE
-        if time.time() - self.time_at_respawn > 27:
-            return SCATTER
-        if time.time() - self.time_at_respawn > 7:
-            return CHASE
-        return SCATTER
+        return get_phase(MODE_PHASE_TABLE, self.ticks_since_respawn)
 
     def respawn(self):
-        self.time_at_respawn = time.time()
-        self.position = self.respawn_position
+        self.ticks_since_respawn = 0
+        self.set_position(self.respawn_position)
 
     def get_available_moves(self):
-        all_possible_moves = moves.get_next_position_by_move(self.position)
-
-        non_blocked_moves = {}
-        for direction, new_position in all_possible_moves.items():
-            # Remove directions that hit a wall
-            if new_position in self.gamestate.get_wall_positions():
-                continue
-            # Remove previous direction
-            if moves.OPPOSITE_MOVES[direction] == self.previous_move:
-                continue
-            non_blocked_moves[direction] = new_position
-
-        # This means that we are stuck in a corner
-        if len(non_blocked_moves.values()) == 0:
-            opposite_direction = moves.OPPOSITE_MOVES[self.previous_move]
-            non_blocked_moves[opposite_direction] = all_possible_moves[opposite_direction]
-
-        return non_blocked_moves
+        return dict(self.gamestate.navigation.get_exits(self.position, self.previous_move))
 
     def get_direction(self):
-        possible_moves = self.get_available_moves()
-        distance_per_move = {}
-        for direction, new_position in possible_moves.items():
-            distance_per_move[direction] = moves.calculate_euclidean_distance_to_target(self.target_position, new_position)
-
-        min_distance = min(distance_per_move.values())
-        best_moves = [move for move in distance_per_move if distance_per_move[move] == min_distance]
-        return self.get_prioritized_moves(best_moves)
-
-    def get_prioritized_moves(self, possible_moves):
-        for move in possible_moves:
-            if move == "UP":
-                return move
-            if move == "LEFT":
-                return move
-            if move == "DOWN":
-                return move
-            if move == "RIGHT":
-                return move
+        return self.gamestate.navigation.choose_move(self.position, self.previous_move, self.target_position)
 
     def chase_pacman(self):
         direction = self.get_direction()
@@ -102,7 +59,7 @@ class Ghost(Existence):
             return
         if mode == SCATTER:
             corners = self.gamestate.get_corners()
-            random.shuffle(corners)
+            (self.gamestate.rng or random).shuffle(corners)
             self.target_position = corners[0]
             self.mode = mode
         if mode == CHASE:
@@ -115,4 +72,5 @@ class Ghost(Existence):
             self.chase_pacman()
         elif self.mode == SCATTER:
             self.scatter()
+        self.ticks_since_respawn += 1
 
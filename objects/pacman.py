@@ -2,7 +2,6 @@ import time
 
 import utils.moves as moves
 from objects.existence import Existence
-from objects.dot import Dot
 from pacman.gamestate import GameState
 
 
@@ -13,6 +12,7 @@ class Pacman(Existence):
         self.max_lives = 3
         self.respawn_position = position
         self.current_move = "NONE"
+        # Only used to animate Pac-Man
         self.time_at_last_tick = time.time()
         self.number_of_ticks = 0
 
@@ -20,7 +20,7 @@ class Pacman(Existence):
         self.lives -= lives_lost
 
     def respawn(self):
-        self.position = self.respawn_position
+        self.set_position(self.respawn_position)
         self.current_move = "NONE"
 
     def set_move(self, move):
@@ -37,14 +37,7 @@ class Pacman(Existence):
         Returns:
 
         """
-        active_items = []
-        active_items.extend(self.gamestate.get_active_dots())
-
-        for item in active_items:
-            if item.position == self.position:
-                item.eat()
-                if type(item) == Dot:
-                    game_state.num_dots_left -= 1
+        game_state.eat_dot_at(self.position)
 
     def tick(self, game_state):
         direction = moves.DIRECTION_FROM_MOVE[self.current_move]
@@ -0,0 +1,198 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+import utils.moves as moves
+from pacman.distances import DistanceMap
+from pacman.navigation import compute_exit_masks
+from pacman.zobrist import generate_zobrist_keys
+
+BOARD_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'boards')
+# Compiled boards are written to the user's cache directory unless PACMAN_BOARD_CACHE points somewhere else
+CACHE_DIRECTORY = os.environ.get('PACMAN_BOARD_CACHE', os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'pacman', 'boards'))
+# Bump when the compiled format changes, so old files are not picked up
+FORMAT_VERSION = 3
+# Order of the columns of CompiledBoard.neighbours
+NEIGHBOUR_MOVES = ["UP", "LEFT", "DOWN", "RIGHT"]
+
+# Cell codes of the compiled grid
+EMPTY = 0
+WALL = 1
+DOT = 2
+PACMAN = 3
+GHOST = 4
+# Cells past the end of a line that is shorter than the longest one. Agents cannot enter them, like walls
+OUTSIDE = 255
+CELL_CODES = {'%': WALL, '.': DOT, 'P': PACMAN, 'G': GHOST}
+
+
+class CompiledBoard:
+    """
+        A board file parsed into arrays, together with the tables read_level builds a game state from. All
+        positions are (x, y) and in the order the cells appear in the file, which is the order read_level creates
+        the objects of a board in.
+    """
+
+    def __init__(self, arrays):
+        self.grid = arrays['grid']
+        self.num_lines = int(arrays['num_lines'])
+        self.positions = arrays['positions']
+        self.walls = arrays['walls']
+        self.dots = arrays['dots']
+        self.ghosts = arrays['ghosts']
+        # (-1, -1) if the board has no Pac-Man
+        self.pacman = arrays['pacman']
+        # Positions agents cannot enter that are not walls: OUTSIDE cells and the ring around the grid
+        self.blocked = arrays['blocked']
+        # Open cells, the index of the open cell next to each of them in every NEIGHBOUR_MOVES direction (-1 for
+        # none) and their GhostNavigation exits
+        self.cells = arrays['cells']
+        self.neighbours = arrays['neighbours']
+        self.exit_masks = arrays['exit_masks']
+        # Zobrist keys of every agent on every open cell and of every dot
+        self.zobrist_agent_keys = arrays['zobrist_agent_keys']
+        self.zobrist_dot_keys = arrays['zobrist_dot_keys']
+        self.distance_matrix = arrays.get('distance_matrix')
+
+    def get_dimensions(self):
+        # Same as read_level always had: number of lines and length of the first line
+        return [self.num_lines, int((self.grid[0] != OUTSIDE).sum()) if self.num_lines else 0]
+
+    def get_pacman_position(self):
+        if self.pacman[0] < 0:
+            return None
+        return int(self.pacman[0]), int(self.pacman[1])
+
+    def to_arrays(self):
+        arrays = {'grid': self.grid, 'num_lines': np.int64(self.num_lines), 'positions': self.positions,
+                  'walls': self.walls, 'blocked': self.blocked, 'dots': self.dots, 'ghosts': self.ghosts,
+                  'pacman': self.pacman,
+                  'cells': self.cells, 'neighbours': self.neighbours, 'exit_masks': self.exit_masks,
+                  'zobrist_agent_keys': self.zobrist_agent_keys, 'zobrist_dot_keys': self.zobrist_dot_keys}
+        if self.distance_matrix is not None:
+            arrays['distance_matrix'] = self.distance_matrix
+        return arrays
+
+
+def get_positions(grid, codes):
+    # argwhere walks the grid row by row, the order of the board file
+    rows_and_columns = np.argwhere(np.isin(grid, codes))
+    return rows_and_columns[:, ::-1].astype(np.int32)
+
+
+def get_blocked_positions(grid):
+    """
+        OUTSIDE cells and the positions just off the grid, in the order of get_positions for the former
+    """
+    rows, columns = grid.shape
+    ring = [(x, y) for x in range(-1, columns + 1) for y in (-1, rows)]
+    ring += [(x, y) for y in range(rows) for x in (-1, columns)]
+    return np.concatenate([get_positions(grid, [OUTSIDE]), np.array(ring, dtype=np.int32).reshape(-1, 2)])
+
+
+def compute_neighbours(grid, cells):
+    """
+        Index in cells of the open cell next to every cell, in the NEIGHBOUR_MOVES directions, -1 where there is none
+    """
+    cell_grid = np.full((grid.shape[0] + 2, grid.shape[1] + 2), -1, dtype=np.int32)
+    cell_grid[cells[:, 1] + 1, cells[:, 0] + 1] = np.arange(len(cells))
+    x, y = cells[:, 0] + 1, cells[:, 1] + 1
+    return np.stack([cell_grid[y + moves.DIRECTION_FROM_MOVE[move][1], x + moves.DIRECTION_FROM_MOVE[move][0]]
+                     for move in NEIGHBOUR_MOVES], axis=1)
+
+
+def compile_board(text):
+    """
+        Parse the text of a board file and compute the tables of its game state
+    Returns:
+        CompiledBoard
+    """
+    lines = text.splitlines()
+    width = max((len(line) for line in lines), default=0)
+    grid = np.full((len(lines), width), OUTSIDE, dtype=np.uint8)
+    for y, line in enumerate(lines):
+        grid[y, :len(line)] = [CELL_CODES.get(symbol, EMPTY) for symbol in line]
+
+    positions = get_positions(grid, [EMPTY, WALL, DOT, PACMAN, GHOST])
+    cells = get_positions(grid, [EMPTY, DOT, PACMAN, GHOST])
+    dots = get_positions(grid, [DOT])
+    ghosts = get_positions(grid, [GHOST])
+    pacman = get_positions(grid, [PACMAN])
+    zobrist_agent_keys, zobrist_dot_keys = generate_zobrist_keys(len(cells), min(len(pacman), 1) + len(ghosts),
+                                                                 len(dots))
+    return CompiledBoard({
+        'grid': grid,
+        'num_lines': len(lines),
+        'positions': positions,
+        'walls': get_positions(grid, [WALL]),
+        'blocked': get_blocked_positions(grid),
+        'dots': dots,
+        'ghosts': ghosts,
+        # When a board has several, the last Pac-Man wins
+        'pacman': pacman[-1] if len(pacman) else np.array([-1, -1], dtype=np.int32),
+        'cells': cells,
+        'neighbours': compute_neighbours(grid, cells),
+        'exit_masks': compute_exit_masks((grid == WALL) | (grid == OUTSIDE), cells),
+        'zobrist_agent_keys': zobrist_agent_keys,
+        'zobrist_dot_keys': zobrist_dot_keys,
+    })
+
+
+def get_cache_path(board_path, content):
+    digest = hashlib.sha1(content + b'%d' % FORMAT_VERSION).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(board_path))[0]
+    return os.path.join(CACHE_DIRECTORY, '%s-%s.npz' % (name, digest))
+
+
+def save_compiled_board(path, board):
+    """
+        Write the compiled board next to its final path and move it there, so processes that load the same board
+        at the same time never see half a file. Errors are ignored, the cache is only an optimisation
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temporary_path = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(path))
+        with os.fdopen(handle, 'wb') as f:
+            np.savez(f, **board.to_arrays())
+        os.replace(temporary_path, path)
+    except OSError:
+        pass
+
+
+def load_board(board_path, with_distances=False):
+    """
+        Compiled version of a board file, from the cache if the file did not change since it was compiled
+    Args:
+        board_path: path of the board text file
+        with_distances: make sure the board has its distance_matrix, computing and caching it if needed
+
+    Returns:
+        CompiledBoard
+    """
+    with open(board_path, 'rb') as f:
+        content = f.read()
+    cache_path = get_cache_path(board_path, content)
+
+    board = None
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as arrays:
+                board = CompiledBoard(dict(arrays))
+        except (OSError, ValueError, KeyError):
+            board = None
+
+    if board is None or (with_distances and board.distance_matrix is None):
+        if board is None:
+            board = compile_board(content.decode())
+        if with_distances:
+            board.distance_matrix = compute_distance_matrix(board)
+        save_compiled_board(cache_path, board)
+    return board
+
+
+def compute_distance_matrix(board):
+    cells = list(map(tuple, board.cells.tolist()))
+    return DistanceMap(cells, board.neighbours, precompute=True).matrix
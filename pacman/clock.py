@@ -0,0 +1,30 @@
+# The simulation advances in ticks. When the game is played in real time, one tick lasts this long
+TICK_MILLISECONDS = 400
+
+
+def build_phase_table(initial_phase, phase_changes, tick_milliseconds=TICK_MILLISECONDS):
+    """
+        Precompute the phase of every tick from a schedule given in milliseconds
+    Args:
+        initial_phase: phase at tick 0
+        phase_changes: list of (start in milliseconds, phase), sorted by start. A phase starts on the first
+            tick strictly after its start time
+        tick_milliseconds: duration of one tick
+
+    Returns:
+        List with the phase of every tick up to and including the first tick of the last phase
+    """
+    last_tick = phase_changes[-1][0] // tick_milliseconds + 1
+    table = []
+    for tick in range(last_tick + 1):
+        phase = initial_phase
+        for start, next_phase in phase_changes:
+            if tick * tick_milliseconds > start:
+                phase = next_phase
+        table.append(phase)
+    return table
+
+
+def get_phase(phase_table, tick):
+    # Ticks past the end of the table stay in the last phase
+    return phase_table[min(tick, len(phase_table) - 1)]
@@ -0,0 +1,96 @@
+from collections import OrderedDict, deque
+
+import numpy as np
+
+UNREACHABLE = np.iinfo(np.uint16).max
+DISTANCE_CACHE_SIZE = 1024
+
+
+class DistanceMap:
+    """
+        Shortest path distances through the maze between the open cells of a board.
+        With precompute=True every BFS is run when the board is loaded and kept in a uint16 matrix with a row per
+        cell. Otherwise a cell's distance field is computed the first time it is needed and kept in an LRU cache.
+    """
+
+    def __init__(self, cells, neighbours, precompute=False, cache_size=DISTANCE_CACHE_SIZE, matrix=None):
+        """
+        Args:
+            cells: the open cells of the board, as (x, y) tuples
+            neighbours: (len(cells), 4) array with the index of the open cell next to every cell in each direction,
+                -1 where there is none, see board_compiler.compute_neighbours
+            matrix: distance matrix computed earlier for the same board, e.g. by the board compiler
+        """
+        self.cells = cells
+        self.cell_index = dict(zip(cells, range(len(cells))))
+        self.neighbours = [[neighbour for neighbour in row if neighbour >= 0] for row in neighbours.tolist()]
+
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.matrix = matrix
+        if precompute and matrix is None:
+            self.matrix = np.stack([self.breadth_first_search(index) for index in range(len(self.cells))])
+
+    def __deepcopy__(self, memo):
+        # Distances only depend on the walls, so copies of a game state can share them
+        return self
+
+    def breadth_first_search(self, source):
+        distances = [UNREACHABLE] * len(self.cells)
+        distances[source] = 0
+        queue = deque([source])
+        while queue:
+            cell = queue.popleft()
+            for neighbour in self.neighbours[cell]:
+                if distances[neighbour] == UNREACHABLE:
+                    distances[neighbour] = distances[cell] + 1
+                    queue.append(neighbour)
+        return np.array(distances, dtype=np.uint16)
+
+    def get_distances_from(self, position):
+        """
+            Distance field of a cell, indexed like self.cells. None if the position is not an open cell
+        """
+        index = self.cell_index.get(position)
+        if index is None:
+            return None
+        if self.matrix is not None:
+            return self.matrix[index]
+
+        distances = self.cache.get(index)
+        if distances is None:
+            distances = self.breadth_first_search(index)
+            self.cache[index] = distances
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(index)
+        return distances
+
+    def get_distance(self, source, target):
+        """
+            Number of moves from source to target, None if one of them is a wall or they are not connected
+        """
+        distances = self.get_distances_from(target)
+        if distances is None or source not in self.cell_index:
+            return None
+        distance = int(distances[self.cell_index[source]])
+        return None if distance == UNREACHABLE else distance
+
+    def get_nearest(self, source, targets):
+        """
+            The reachable target closest to source
+        Returns:
+            (target, distance) or (None, None) if no target can be reached
+        """
+        distances = self.get_distances_from(source)
+        nearest, nearest_distance = None, None
+        if distances is None:
+            return nearest, nearest_distance
+        for target in targets:
+            index = self.cell_index.get(target)
+            if index is None or distances[index] == UNREACHABLE:
+                continue
+            if nearest_distance is None or distances[index] < nearest_distance:
+                nearest, nearest_distance = target, int(distances[index])
+        return nearest, nearest_distance
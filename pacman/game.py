@@ -1,90 +1,91 @@
 import sys
-from copy import deepcopy
 
 import pygame
 
 import graphics.draw_board as b
-from pacman import gamelogic
-from pacman.gamelogic import ActionEvent, check_if_pacman_ate_food, check_ghost_collisions
-from pacman.gamestate import GameState
-from pacman.initializer import initialize_gamestate_from_file
+from pacman.clock import TICK_MILLISECONDS
 from pacman.keymapper import map_key_to_move
+from pacman.profiler import get_profiler, set_profiler
+from pacman.simulation import Simulation
 
-import time
-
-MOVE_GHOST_EVENT = pygame.USEREVENT+1
+# Pac-Man and the ghosts both move on this tick; the simulation steps them together
 PACMAN_TICK = pygame.USEREVENT+2
 
 class Game:
-    def __init__(self, level, init_screen=False, ai_function=None):
+    def __init__(self, level, init_screen=False, ai_function=None, profiler=None, recorder=None):
+        """
+        Args:
+            profiler (Profiler): if given, the game loop and the game logic report their phase timings to it while
+                run is running
+            recorder (EpisodeRecorder): if given, the game is appended to its log
+        """
         pygame.init()
+        self.profiler = profiler
         self.clock = pygame.time.Clock()
-        self.initial_game_state = initialize_gamestate_from_file(level)
-        self.game_state = self.initial_game_state
+        self.recorder = recorder
+        self.simulation = Simulation(level, recorder)
+        self.initial_game_state = self.simulation.initial_game_state
         self.done = False
         self.ai_function = ai_function
-        pygame.time.set_timer(MOVE_GHOST_EVENT, 400)
-        pygame.time.set_timer(PACMAN_TICK, 400)
+        pygame.time.set_timer(PACMAN_TICK, TICK_MILLISECONDS)
         if init_screen:
             self.init_screen()
 
+    @property
+    def game_state(self):
+        return self.simulation.game_state
+
     def init_screen(self):
         self.screen = pygame.display.set_mode((760, 840))
+        self.renderer = b.BoardRenderer(self.screen)
 
     def run(self):
-        while not self.done:
-            self.execute_game_loop()
-
-    def move_ghosts(self):
-        for ghost in self.game_state.ghosts:
-            ghost.tick()
+        previous_profiler = set_profiler(self.profiler) if self.profiler is not None else None
+        try:
+            while not self.done:
+                self.execute_game_loop()
+        finally:
+            # Also when the game ends with sys.exit, so later simulations in this process do not report to it
+            if self.profiler is not None:
+                set_profiler(previous_profiler)
 
     def animate(self):
         """
             Draws game graphics
         """
-        # Wipe screen from previous cycle
-        self.screen.fill((1, 1, 1))
-
-        # Draw current gamestate to the screen
-        b.draw_board(self.game_state, self.screen)
-        b.draw_lives(self.game_state, self.screen)
-        b.draw_score(self.game_state, self.screen)
-
-        pygame.display.flip()
+        # Only the parts of the screen that changed since the previous cycle are redrawn and pushed
+        dirty_rects = self.renderer.draw(self.game_state)
+        pygame.display.update(dirty_rects)
 
     def handle_input_action(self, event):
         move = map_key_to_move(event)
         self.game_state.pacman.set_move(move)
 
-    def reset_if_ghost_collision(self):
-        if check_ghost_collisions(self.game_state):
-            self.game_state = deepcopy(self.initial_game_state)
-
     def execute_game_loop(self, animate=True):
+        profiler = get_profiler()
+        profiler.count('frames')
         # Handle keyboard events for manual playing
-        for event in pygame.event.get():
-            self.game_state.last_game_event = ActionEvent.NONE
-
+        with profiler.phase('event_handling'):
+            events = pygame.event.get()
+        for event in events:
             if event.type == PACMAN_TICK:
+                move = "NONE"
                 if self.ai_function:
-                    action = self.ai_function(self.game_state)
-                    self.game_state.pacman.set_move(action.name)
-                is_move_valid = self.game_state.pacman.tick(self.game_state)
-                if not is_move_valid:
-                    self.game_state.last_game_event = ActionEvent.WALL
-
-                self.reset_if_ghost_collision()
+                    with profiler.phase('ai_decision'):
+                        move = self.ai_function(self.game_state).name
+                self.simulation.step(move)
+                profiler.count('ticks')
             if event.type == pygame.QUIT:
                 self.done = True
-            if event.type == MOVE_GHOST_EVENT:
-                self.move_ghosts()
-                self.reset_if_ghost_collision()
+                # Keep the moves played so far
+                if self.recorder is not None:
+                    self.recorder.end_episode()
 
         # self.handle_input_action(event)
 
         if animate:
-            self.animate()
+            with profiler.phase('animate'):
+                self.animate()
 
         if self.game_state.has_won():
             print("Congratulations you won!")
@@ -1,6 +1,7 @@
 import copy
 from enum import Enum
 from pacman.gamestate import GameState
+from pacman.profiler import get_profiler
 from copy import deepcopy
 
 
@@ -80,36 +81,47 @@ def has_eaten_dot(current_game_state, next_game_state):
         return False
 
 
-def get_next_game_state_from_action(current_game_state, action):
+def get_next_game_state_from_action(current_game_state, action, copy_on_write=True, recorder=None):
     """
 
     Args:
         current_game_state (GameState):
         action:
-        game:
+        copy_on_write: if True the next state shares unchanged structure with current_game_state,
+            otherwise it is a full deepcopy
+        recorder (EpisodeRecorder): if given, the step is added to its current episode
 
     Returns:
 
     """
-    next_game_state = copy.deepcopy(current_game_state)
+    profiler = get_profiler()
+    with profiler.phase('copy_state'):
+        if copy_on_write:
+            next_game_state = current_game_state.get_successor()
+        else:
+            next_game_state = copy.deepcopy(current_game_state)
     next_game_state.pacman.set_move(action)
 
-    is_move_valid = next_game_state.pacman.tick(next_game_state)
-    if not is_move_valid:
-        next_game_state.last_game_event = ActionEvent.WALL
-    else:
-        next_game_state.last_game_event = ActionEvent.NONE
+    with profiler.phase('pacman_tick'):
+        is_move_valid = next_game_state.pacman.tick(next_game_state)
+        if not is_move_valid:
+            next_game_state.last_game_event = ActionEvent.WALL
+        else:
+            next_game_state.last_game_event = ActionEvent.NONE
 
-    eaten_food = check_if_pacman_ate_food(current_game_state, next_game_state)
-    if eaten_food is not None:
-        next_game_state.last_game_event = eaten_food
+        eaten_food = check_if_pacman_ate_food(current_game_state, next_game_state)
+        if eaten_food is not None:
+            next_game_state.last_game_event = eaten_food
 
-    check_ghost_collisions(next_game_state)
+    with profiler.phase('collision_check'):
+        check_ghost_collisions(next_game_state)
 
-    for ghost in next_game_state.ghosts:
-        ghost.tick()
+    with profiler.phase('ghost_tick'):
+        for ghost in next_game_state.ghosts:
+            ghost.tick()
 
-    check_ghost_collisions(next_game_state)
+    with profiler.phase('collision_check'):
+        check_ghost_collisions(next_game_state)
 
     if next_game_state.has_won():
         next_game_state.last_game_event = ActionEvent.WON
@@ -117,6 +129,9 @@ def get_next_game_state_from_action(current_game_state, action):
     if next_game_state.has_lost():
         next_game_state.last_game_event = ActionEvent.LOST
 
+    if recorder is not None:
+        recorder.record_step(action, next_game_state)
+
     return next_game_state, next_game_state.last_game_event
 
 
@@ -137,7 +152,4 @@ def get_next_gamestate_by_move(gamestate):
 
 
 def is_wall(gamestate, position):
-    for wall in gamestate.walls:
-        if wall.position == position:
-            return True
-    return False
\ No newline at end of file
+    return gamestate.is_wall(position)
\ No newline at end of file
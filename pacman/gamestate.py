@@ -1,5 +1,5 @@
-from functools import reduce
-import collections
+import copy
+import struct
 
 
 class GameState:
@@ -7,12 +7,31 @@ class GameState:
         self.pacman = None
         self.walls = []
         self.ghosts = []
+        # All dots of the board, in the order they were added. Never changes after loading
         self.dots = []
         self.dimensions = []
         # As walls are static, we do not need to look them up every time we need to know
         self.wall_positions = []
+        # Passability index, built once when the board is loaded
+        self.wall_index = frozenset()
+        # Precomputed ghost moves for every cell, see GhostNavigation
+        self.navigation = None
+        # Maze distances between open cells, see DistanceMap
+        self.distances = None
         self.last_game_event = None
         self.num_dots_left = 0
+        # Dot store indexed by position: dot_bits maps a position to its index in self.dots and
+        # bit i of dot_mask is set while self.dots[i] has not been eaten
+        self.dot_bits = {}
+        self.dot_mask = 0
+        self.total_dot_score = 0
+        # Score of the dots eaten so far, kept up to date by eat_dot_at
+        self.eaten_dot_score = 0
+        # Random generator of the game's own random choices, the global one if None. Successors share it
+        self.rng = None
+        # Zobrist keys of the board and the hash they give for this state, kept up to date on every change
+        self.zobrist = None
+        self.zobrist_hash = 0
 
     def __str__(self):
         board = self.get_text_representation_of_gamestate()
@@ -21,53 +40,158 @@ class GameState:
         return '\n'.join(collapsed)
 
     def __hash__(self):
-        obj_hash = hash(tuple([9 * x for x in self.pacman.position]))
-
-        for w in self.walls:
-            obj_hash += hash(w.position)
-
-        for g in self.ghosts:
-            obj_hash += hash(g.position)
-
-        for d in self.dots:
-            if not d.is_eaten:
-                obj_hash += hash(d.position)
-
-        return obj_hash
+        if self.zobrist is None:
+            return hash(self.get_key())
+        return self.zobrist_hash
 
     def __eq__(self, other):
-        if isinstance(other, GameState):
-            if self.pacman.position != other.pacman.position:
-                return False
-            if collections.Counter([w.position for w in self.walls]) != collections.Counter(
-                    [w.position for w in other.walls]):
-                return False
-            if collections.Counter([w.position for w in self.ghosts]) != collections.Counter(
-                    [w.position for w in other.ghosts]):
-                return False
-            if collections.Counter([w.position for w in self.dots]) != collections.Counter(
-                    [w.position for w in other.dots]):
-                return False
-            if self.num_dots_left != other.num_dots_left:
-                return False
-        return True
+        if self is other:
+            return True
+        if not isinstance(other, GameState):
+            return False
+        # A state without Zobrist keys hashes its key instead, so only Zobrist hashes can be compared
+        if self.zobrist is not None and other.zobrist is not None and self.zobrist_hash != other.zobrist_hash:
+            return False
+        return self.get_key() == other.get_key() and self.is_same_board(other)
+
+    def is_same_board(self, other):
+        # Every state of a board shares its wall index, successors and copies included
+        return self.wall_index is other.wall_index
+
+    def get_key(self):
+        """
+            Compact key that identifies the state: Pac-Man's position, the ghost positions and the remaining dots
+        """
+        return self.pacman.position, tuple(ghost.position for ghost in self.ghosts), self.dot_mask
+
+    def encode_key(self):
+        """
+            get_key packed into bytes. Every state of the same board encodes to the same length
+        """
+        coordinates = []
+        for agent in self.get_agents():
+            coordinates.extend(agent.position)
+        dots = self.dot_mask.to_bytes((len(self.dots) + 7) // 8, 'little')
+        return struct.pack('<%dH' % len(coordinates), *coordinates) + dots
+
+    def get_agents(self):
+        agents = [self.pacman] if self.pacman is not None else []
+        agents.extend(self.ghosts)
+        return agents
+
+    def init_zobrist_hash(self, zobrist):
+        for agent_index, agent in enumerate(self.get_agents()):
+            agent.agent_index = agent_index
+        self.zobrist = zobrist
+        self.zobrist_hash = zobrist.hash_game_state(self)
+
+    def move_agent(self, agent, position):
+        if self.zobrist is not None:
+            self.zobrist_hash ^= self.zobrist.get_agent_key(agent.agent_index, agent.position)
+            self.zobrist_hash ^= self.zobrist.get_agent_key(agent.agent_index, position)
+        agent.position = position
+
+    def add_dot(self, dot):
+        bit = len(self.dots)
+        self.dots.append(dot)
+        self.dot_bits[dot.position] = bit
+        self.dot_mask |= 1 << bit
+        self.num_dots_left += 1
+        self.total_dot_score += dot.score
+
+    def add_dots(self, dots):
+        """
+            Same as add_dot for every dot, with the bitmask updated once
+        """
+        first_bit = len(self.dots)
+        self.dots.extend(dots)
+        self.dot_bits.update(zip([dot.position for dot in dots], range(first_bit, len(self.dots))))
+        self.dot_mask |= ((1 << len(dots)) - 1) << first_bit
+        self.num_dots_left += len(dots)
+        self.total_dot_score += sum(dot.score for dot in dots)
+
+    def eat_dot_at(self, position):
+        """
+            Eat the dot on the given position, if there is one left
+        Returns:
+            The eaten Dot or None
+        """
+        bit = self.dot_bits.get(position)
+        if bit is None or not self.dot_mask >> bit & 1:
+            return None
+        self.dot_mask &= ~(1 << bit)
+        self.num_dots_left -= 1
+        self.eaten_dot_score += self.dots[bit].score
+        if self.zobrist is not None:
+            self.zobrist_hash ^= self.zobrist.get_dot_key(bit)
+        return self.dots[bit]
+
+    def iter_active_dots(self):
+        mask = self.dot_mask
+        while mask:
+            lowest_bit = mask & -mask
+            yield self.dots[lowest_bit.bit_length() - 1]
+            mask ^= lowest_bit
 
     def get_active_dots(self):
-        return [dot for dot in self.dots if not dot.is_eaten]
+        return list(self.iter_active_dots())
 
     def get_number_of_dots_eaten(self):
-        # TODO: Test
-        return reduce((lambda acc, dot: acc + 1 if dot.is_eaten else acc), self.dots, 0)
+        return len(self.dots) - self.num_dots_left
+
+    def adopt(self, agent):
+        agent = copy.copy(agent)
+        agent.gamestate = self
+        return agent
+
+    def get_successor(self):
+        """
+            Cheap alternative to deepcopy for stepping the game. The successor shares walls and dots with
+            this state; only the agents are copied. Eaten dots are tracked in an immutable bitmask, so eating
+            a dot in the successor never affects this state.
+        Returns:
+            GameState
+        """
+        successor = copy.copy(self)
+        successor.pacman = successor.adopt(self.pacman)
+        successor.ghosts = [successor.adopt(ghost) for ghost in self.ghosts]
+        return successor
+
+    def __deepcopy__(self, memo):
+        # The board never changes after loading, so copies share walls, dots and their indexes like successors do.
+        # The agents and the random generator are copied
+        copied = copy.copy(self)
+        memo[id(self)] = copied
+        copied.pacman = copy.deepcopy(self.pacman, memo)
+        copied.ghosts = copy.deepcopy(self.ghosts, memo)
+        copied.rng = copy.deepcopy(self.rng, memo)
+        return copied
 
     def get_wall_positions(self):
         return self.wall_positions
 
+    def is_wall(self, position):
+        return position in self.wall_index
+
+    def get_maze_distance(self, source, target):
+        return self.distances.get_distance(source, target)
+
+    def get_nearest_dot(self, position):
+        """
+            The remaining dot with the shortest path from position
+        Returns:
+            (Dot, distance) or (None, None) if no dot can be reached
+        """
+        dots_by_position = {dot.position: dot for dot in self.iter_active_dots()}
+        nearest, distance = self.distances.get_nearest(position, dots_by_position)
+        return dots_by_position.get(nearest), distance
+
     def get_corners(self):
         w, h = self.dimensions
         return [(0,0), (w, 0), (0, h), (h, w)]
 
     def has_won(self):
-        if len(self.get_active_dots()) > 0:
+        if self.num_dots_left > 0:
             return False
         if self.pacman.lives > 0:
             return True
@@ -77,16 +201,13 @@ class GameState:
         return self.pacman.lives <= 0
 
     def calculate_score(self):
-        score = 0
-        for dot in self.dots:
-            score += dot.score if dot.is_eaten else 0
-        return score - self.pacman.number_of_ticks
+        return self.eaten_dot_score - self.pacman.number_of_ticks
 
     # The order matters. It determines the drawing order
     def retrieve_all_active_items(self):
         items = []
         items.extend(self.walls)
-        items.extend(self.get_active_dots())
+        items.extend(self.iter_active_dots())
         items.extend(self.ghosts)
         items.append(self.pacman)
         return items
@@ -1,40 +1,46 @@
+import os
+
 from objects.pacman import Pacman
 from objects.wall import Wall
 from objects.ghost import Ghost
 from objects.dot import Dot
+from pacman.board_compiler import BOARD_DIRECTORY, load_board
 from pacman.gamestate import GameState
+from pacman.distances import DistanceMap
+from pacman.navigation import GhostNavigation
+from pacman.zobrist import ZobristTable
 
 
-def translate_input_symbol_to_object(position, gamestate, symbol):
-    if symbol == "P":
-        gamestate.pacman = Pacman(position, gamestate)
-    if symbol == "%":
-        gamestate.walls.append(Wall(position, gamestate))
-        gamestate.wall_positions.append(position)
-    if symbol == "G":
-        gamestate.ghosts.append(Ghost(position, gamestate))
-    if symbol == ".":
-        gamestate.dots.append(Dot(position, gamestate))
-        gamestate.num_dots_left += 1
+def initialize_gamestate_from_file(file, precompute_distances=False):
+    return read_level(file, precompute_distances)
 
 
-def initialize_gamestate_from_file(file):
-    gamestate = read_level(file)
-    return gamestate
+def get_board_path(level):
+    # A level is either the name of a board in boards/ or the path of a board file
+    if level.endswith('.txt'):
+        return level
+    return os.path.join(BOARD_DIRECTORY, level + '.txt')
 
 
-def read_level(level):
-    y_pointer = 0
-    x_pointer = 0
+def read_level(level, precompute_distances=False):
+    board = load_board(get_board_path(level), with_distances=precompute_distances)
     gamestate = GameState()
-    with open("../boards/" + level + '.txt', "r") as f:
-        f = f.read().splitlines()
-        gamestate.dimensions = [len(f), len(f[0])]
-        for y in f:
-            for item in y:
-                current_position = x_pointer, y_pointer
-                translate_input_symbol_to_object(current_position, gamestate, item)
-                x_pointer += 1
-            y_pointer += 1
-            x_pointer = 0
+    gamestate.dimensions = board.get_dimensions()
+    pacman_position = board.get_pacman_position()
+    if pacman_position is not None:
+        gamestate.pacman = Pacman(pacman_position, gamestate)
+    gamestate.wall_positions = list(map(tuple, board.walls.tolist()))
+    gamestate.walls = [Wall(position, gamestate) for position in gamestate.wall_positions]
+    for position in board.ghosts.tolist():
+        gamestate.ghosts.append(Ghost(tuple(position), gamestate))
+    gamestate.add_dots([Dot(position, gamestate) for position in map(tuple, board.dots.tolist())])
+
+    # Everything else comes precomputed with the compiled board
+    cells = list(map(tuple, board.cells.tolist()))
+    # Agents cannot leave the board either, so the positions around it block them like walls
+    gamestate.wall_index = frozenset(gamestate.wall_positions).union(map(tuple, board.blocked.tolist()))
+    gamestate.distances = DistanceMap(cells, board.neighbours, precompute_distances, matrix=board.distance_matrix)
+    gamestate.navigation = GhostNavigation(gamestate.wall_index, gamestate.distances.cell_index, board.exit_masks)
+    gamestate.navigation.use_distance_map(gamestate.distances)
+    gamestate.init_zobrist_hash(ZobristTable(cells, board.zobrist_agent_keys, board.zobrist_dot_keys))
     return gamestate
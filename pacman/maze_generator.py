@@ -0,0 +1,112 @@
+"""
+    Random boards for scaling tests, in the format read_level reads, e.g.
+
+        python -m pacman.maze_generator --width 201 --height 201 --loops 0.2 --ghosts 8 --seed 1 maze.txt
+"""
+import argparse
+import random
+
+WALL_SYMBOL = '%'
+DOT_SYMBOL = '.'
+PACMAN_SYMBOL = 'P'
+GHOST_SYMBOL = 'G'
+
+
+def carve_maze(width, height, rng):
+    """
+        Perfect maze (exactly one path between any two cells) on the odd rows and columns of a grid full of walls,
+        carved by an iterative depth-first search
+    Returns:
+        List of rows, True for open cells
+    """
+    open_cells = [[False] * width for y in range(height)]
+    start = (1 + 2 * rng.randrange((width - 1) // 2), 1 + 2 * rng.randrange((height - 1) // 2))
+    open_cells[start[1]][start[0]] = True
+    stack = [start]
+    while stack:
+        x, y = stack[-1]
+        neighbours = [(x + dx, y + dy) for dx, dy in ((0, -2), (2, 0), (0, 2), (-2, 0))
+                      if 0 < x + dx < width - 1 and 0 < y + dy < height - 1 and not open_cells[y + dy][x + dx]]
+        if not neighbours:
+            stack.pop()
+            continue
+        next_x, next_y = rng.choice(neighbours)
+        open_cells[(y + next_y) // 2][(x + next_x) // 2] = True
+        open_cells[next_y][next_x] = True
+        stack.append((next_x, next_y))
+    return open_cells
+
+
+def add_loops(open_cells, loop_density, rng):
+    """
+        Open the given fraction of the walls that separate two corridors, which adds cycles to the maze
+    """
+    height, width = len(open_cells), len(open_cells[0])
+    for y in range(1, height - 1):
+        for x in range(1, width - 1):
+            if open_cells[y][x] or (x % 2 == 0) == (y % 2 == 0):
+                continue
+            separates_row = open_cells[y][x - 1] and open_cells[y][x + 1]
+            separates_column = open_cells[y - 1][x] and open_cells[y + 1][x]
+            if (separates_row or separates_column) and rng.random() < loop_density:
+                open_cells[y][x] = True
+
+
+def generate_maze(width, height, loop_density=0.1, num_ghosts=4, seed=None):
+    """
+        Random board surrounded by walls, with a dot on every open cell except those of Pac-Man and the ghosts
+    Args:
+        width, height: size in cells including the outer walls, at least 5. With an even size the last
+            column or row is wall as well
+        loop_density: fraction of the walls between two corridors that is removed. 0 gives a perfect maze
+            with dead ends everywhere, 1 an open grid of pillars
+        num_ghosts: number of ghosts, placed on random cells
+        seed: seed of the random generator, the same arguments always give the same board
+
+    Returns:
+        Text of the board
+    """
+    if width < 5 or height < 5:
+        raise ValueError("A maze needs to be at least 5x5, got %dx%d" % (width, height))
+    rng = random.Random(seed)
+    open_cells = carve_maze(width, height, rng)
+    add_loops(open_cells, loop_density, rng)
+
+    board = [[DOT_SYMBOL if is_open else WALL_SYMBOL for is_open in row] for row in open_cells]
+    free_cells = [(x, y) for y, row in enumerate(open_cells) for x, is_open in enumerate(row) if is_open]
+    if num_ghosts + 1 > len(free_cells):
+        raise ValueError("A %dx%d maze has no room for %d ghosts" % (width, height, num_ghosts))
+    # Pac-Man starts on the open cell closest to the centre, the ghosts anywhere else
+    pacman = min(free_cells, key=lambda cell: (cell[0] - width // 2) ** 2 + (cell[1] - height // 2) ** 2)
+    free_cells.remove(pacman)
+    board[pacman[1]][pacman[0]] = PACMAN_SYMBOL
+    for x, y in rng.sample(free_cells, num_ghosts):
+        board[y][x] = GHOST_SYMBOL
+    return '\n'.join(''.join(row) for row in board)
+
+
+def write_maze(path, width, height, loop_density=0.1, num_ghosts=4, seed=None):
+    """
+        Generate a maze and save it as a board file, see generate_maze
+    Returns:
+        path
+    """
+    with open(path, 'w') as f:
+        f.write(generate_maze(width, height, loop_density, num_ghosts, seed))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a random Pac-Man board')
+    parser.add_argument('output', help='path of the board file to write')
+    parser.add_argument('--width', type=int, default=41)
+    parser.add_argument('--height', type=int, default=41)
+    parser.add_argument('--loops', type=float, default=0.1, help='fraction of inner walls to remove')
+    parser.add_argument('--ghosts', type=int, default=4)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    write_maze(args.output, args.width, args.height, args.loops, args.ghosts, args.seed)
+
+
+if __name__ == '__main__':
+    main()
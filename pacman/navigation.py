@@ -0,0 +1,135 @@
+import numpy as np
+
+import utils.moves as moves
+
+# Order in which ghosts prefer moves that are equally good
+MOVE_PRIORITY = ["UP", "LEFT", "DOWN", "RIGHT"]
+MOVE_DIRECTIONS = [(move, moves.DIRECTION_FROM_MOVE[move]) for move in MOVE_PRIORITY]
+# Columns of the exit masks, see compute_exit_masks
+PREVIOUS_MOVES = [None] + MOVE_PRIORITY
+PREVIOUS_MOVE_COLUMNS = {previous_move: column for column, previous_move in enumerate(PREVIOUS_MOVES)}
+DECISION_CACHE_SIZE = 100000
+
+
+def find_exits(wall_index, position, previous_move):
+    """
+        Moves a ghost may take from a position, following Ghost.get_available_moves: no walls and no turning back,
+        unless turning back is the only way out
+    Returns:
+        Tuple of (move, new position) in MOVE_PRIORITY order
+    """
+    all_possible_moves = moves.get_next_position_by_move(position)
+    exits = tuple((move, all_possible_moves[move]) for move in MOVE_PRIORITY
+                  if all_possible_moves[move] not in wall_index and moves.OPPOSITE_MOVES[move] != previous_move)
+    if not exits and previous_move is not None:
+        opposite_move = moves.OPPOSITE_MOVES[previous_move]
+        exits = ((opposite_move, all_possible_moves[opposite_move]),)
+    return exits
+
+
+def compute_exit_masks(wall_grid, cells):
+    """
+        find_exits of every cell and previous move, computed for the whole board at once
+    Args:
+        wall_grid: boolean array, wall_grid[y, x] is True where agents cannot go. Positions off the grid count
+            as walls
+        cells: (N, 2) array with the (x, y) of the open cells
+
+    Returns:
+        (N, len(PREVIOUS_MOVES)) uint8 array of bit masks, bit i is set when MOVE_PRIORITY[i] is an exit
+    """
+    padded = np.ones((wall_grid.shape[0] + 2, wall_grid.shape[1] + 2), dtype=np.bool_)
+    padded[1:-1, 1:-1] = wall_grid
+    x, y = cells[:, 0] + 1, cells[:, 1] + 1
+    is_open = np.stack([~padded[y + dy, x + dx] for move, (dx, dy) in MOVE_DIRECTIONS], axis=1)
+    bits = 1 << np.arange(len(MOVE_PRIORITY))
+
+    masks = np.zeros((len(cells), len(PREVIOUS_MOVES)), dtype=np.uint8)
+    for column, previous_move in enumerate(PREVIOUS_MOVES):
+        allowed = is_open.copy()
+        if previous_move is not None:
+            back = MOVE_PRIORITY.index(moves.OPPOSITE_MOVES[previous_move])
+            allowed[:, back] = False
+        mask = allowed @ bits
+        if previous_move is not None:
+            # Dead ends turn back
+            mask[mask == 0] = bits[back]
+        masks[:, column] = mask
+    return masks
+
+
+class GhostNavigation:
+    """
+        Ghost moves of a board. The exits of every cell and previous move are compiled with the board, see
+        compute_exit_masks, and turned into (move, position) tuples the first time they are needed.
+        Decisions for a (cell, previous move, target) are cached, so most ghost ticks are a single dict lookup.
+    """
+
+    def __init__(self, wall_index, cell_index, exit_masks, decision_cache_size=DECISION_CACHE_SIZE):
+        """
+        Args:
+            cell_index: position -> row of the open cell in exit_masks
+            exit_masks: see compute_exit_masks
+        """
+        self.wall_index = wall_index
+        self.cell_index = cell_index
+        self.exit_masks = exit_masks
+        self.exits = {}
+        self.decision_cache_size = decision_cache_size
+        self.decisions = {}
+        self.distance_map = None
+
+    def __deepcopy__(self, memo):
+        # The tables only depend on the walls, so copies of a game state can share them
+        return self
+
+    def use_distance_map(self, distance_map):
+        """
+            Make ghosts head for their target along the maze instead of in a straight line, read_level does this
+            for every board. Targets outside the maze, like the scatter corners, still use the straight line
+        Args:
+            distance_map (DistanceMap): None to go back to straight line distances
+        """
+        self.distance_map = distance_map
+        self.decisions.clear()
+
+    def get_distance(self, position, target):
+        if self.distance_map is not None:
+            distance = self.distance_map.get_distance(position, target)
+            if distance is not None:
+                return distance
+        return moves.calculate_euclidean_distance_to_target(target, position)
+
+    def get_exits(self, position, previous_move):
+        exits = self.exits.get((position, previous_move))
+        if exits is None:
+            cell = self.cell_index.get(position)
+            if cell is None:
+                exits = find_exits(self.wall_index, position, previous_move)
+            else:
+                mask = int(self.exit_masks[cell, PREVIOUS_MOVE_COLUMNS[previous_move]])
+                exits = tuple((move, (position[0] + dx, position[1] + dy))
+                              for bit, (move, (dx, dy)) in enumerate(MOVE_DIRECTIONS) if mask >> bit & 1)
+            self.exits[position, previous_move] = exits
+        return exits
+
+    def choose_move(self, position, previous_move, target):
+        """
+            The exit closest to the target, see Ghost.get_direction
+        """
+        key = position, previous_move, target
+        move = self.decisions.get(key)
+        if move is not None:
+            return move
+
+        best_distance = None
+        for exit_move, new_position in self.get_exits(position, previous_move):
+            distance = self.get_distance(new_position, target)
+            if best_distance is None or distance < best_distance:
+                move, best_distance = exit_move, distance
+
+        if len(self.decisions) >= self.decision_cache_size:
+            self.decisions.clear()
+        if self.decision_cache_size > 0:
+            self.decisions[key] = move
+        return move
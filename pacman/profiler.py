@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# Durations are bucketed by their number of bits in nanoseconds, bucket b holds durations in [2^(b-1), 2^b)
+NUM_HISTOGRAM_BUCKETS = 64
+MAX_TRACE_EVENTS = 1000000
+
+NULL_PHASE = nullcontext()
+
+
+class PhaseTimer:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+class PhaseStatistics:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = 0
+        self.histogram = [0] * NUM_HISTOGRAM_BUCKETS
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if self.minimum is None or duration < self.minimum:
+            self.minimum = duration
+        if duration > self.maximum:
+            self.maximum = duration
+        self.histogram[min(duration.bit_length(), NUM_HISTOGRAM_BUCKETS - 1)] += 1
+
+    def get_percentile(self, percentile):
+        """
+            Upper bound of the histogram bucket that holds the given percentile, in nanoseconds
+        """
+        target = percentile / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return (1 << bucket) - 1
+        return self.maximum
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_us': self.total / 1000,
+            'mean_us': self.total / self.count / 1000 if self.count else 0,
+            'min_us': (self.minimum or 0) / 1000,
+            'max_us': self.maximum / 1000,
+            'p50_us': self.get_percentile(50) / 1000,
+            'p99_us': self.get_percentile(99) / 1000,
+            # {upper bound of the bucket in nanoseconds: number of durations}
+            'histogram_ns': {(1 << bucket) - 1: count for bucket, count in enumerate(self.histogram) if count},
+        }
+
+
+class Profiler:
+    """
+        Collects the time spent in named phases of the game loop and the trainer, and named counters.
+
+        Code under measurement wraps a phase in `with get_profiler().phase('name'):`. While profiling is
+        disabled, phase returns a shared no-op context, so the hooks cost one call each.
+    """
+
+    def __init__(self, enabled=True, trace=False, max_trace_events=MAX_TRACE_EVENTS):
+        """
+        Args:
+            enabled: collect timings and counters
+            trace: also keep every phase as an event for export_chrome_trace
+            max_trace_events: events kept at most, later events are dropped
+        """
+        self.enabled = enabled
+        self.trace = trace
+        self.max_trace_events = max_trace_events
+        self.phases = {}
+        self.counters = {}
+        self.trace_events = []
+        self.dropped_trace_events = 0
+        self.start_time = time.perf_counter_ns()
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        return PhaseTimer(self, name)
+
+    def record(self, name, start, end):
+        """
+            Add a phase that ran from start to end, both from time.perf_counter_ns
+        """
+        statistics = self.phases.get(name)
+        if statistics is None:
+            statistics = self.phases[name] = PhaseStatistics()
+        statistics.add(end - start)
+
+        if self.trace:
+            if len(self.trace_events) < self.max_trace_events:
+                self.trace_events.append((name, start, end, threading.get_ident()))
+            else:
+                self.dropped_trace_events += 1
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        self.phases = {}
+        self.counters = {}
+        self.trace_events = []
+        self.dropped_trace_events = 0
+        self.start_time = time.perf_counter_ns()
+
+    def to_dict(self):
+        return {
+            'phases': {name: statistics.to_dict() for name, statistics in self.phases.items()},
+            'counters': dict(self.counters),
+            'dropped_trace_events': self.dropped_trace_events,
+        }
+
+    def get_chrome_trace_events(self):
+        """
+            The recorded phases as complete ("X") events of the Chrome trace-event format, which chrome://tracing
+            and Perfetto can open. Timestamps are in microseconds since the profiler was started.
+        """
+        pid = os.getpid()
+        return [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                 'ts': (start - self.start_time) / 1000, 'dur': (end - start) / 1000}
+                for name, start, end, tid in self.trace_events]
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.get_chrome_trace_events(), 'displayTimeUnit': 'ms'}, f)
+
+    def print_summary(self):
+        for name, statistics in sorted(self.phases.items(), key=lambda item: -item[1].total):
+            summary = statistics.to_dict()
+            print('%-20s %10d calls %12.1f us total %9.2f us mean %9.2f us p99' % (
+                name, summary['count'], summary['total_us'], summary['mean_us'], summary['p99_us']))
+        for name, value in sorted(self.counters.items()):
+            print('%-20s %10d' % (name, value))
+
+
+DISABLED_PROFILER = Profiler(enabled=False)
+_active_profiler = DISABLED_PROFILER
+
+
+def get_profiler():
+    """
+        The profiler the instrumentation hooks report to, a disabled one unless set_profiler was called
+    """
+    return _active_profiler
+
+
+def set_profiler(profiler):
+    """
+        Make the hooks report to profiler, or switch them off if profiler is None
+    Returns:
+        The profiler that was active before
+    """
+    global _active_profiler
+    previous = _active_profiler
+    _active_profiler = profiler if profiler is not None else DISABLED_PROFILER
+    return previous
@@ -0,0 +1,203 @@
+"""
+    Episode log: every episode is stored as the board it was played on, the seed of the game's random generator
+    and the moves that were made, which is all that is needed to simulate it again step by step.
+
+    The log is an append-only file of records. A record is a uint32 length followed by:
+
+        magic 'EPIS', uint8 flags, uint64 seed, 8 bytes of the board file's SHA-1,
+        uint16 length + UTF-8 board id, uint32 number of steps,
+        the moves packed two per byte (low nibble first),
+        with FLAG_CHECKSUMS a uint32 CRC-32 of GameState.encode_key after every step
+"""
+import hashlib
+import random
+import struct
+import zlib
+
+from pacman.actions import Action
+from pacman.initializer import get_board_path
+from pacman.simulation import Simulation
+
+RECORD_MAGIC = b'EPIS'
+FLAG_CHECKSUMS = 1
+# Move code of every move name, with NONE after the four actions
+MOVE_CODES = {action.name: action.value for action in Action}
+MOVE_CODES["NONE"] = len(Action)
+MOVE_NAMES = {code: name for name, code in MOVE_CODES.items()}
+
+LENGTH_FORMAT = struct.Struct('<I')
+HEADER_FORMAT = struct.Struct('<4sBQ8sH')
+STEPS_FORMAT = struct.Struct('<I')
+
+
+def get_board_digest(level):
+    with open(get_board_path(level), 'rb') as f:
+        return hashlib.sha1(f.read()).digest()[:8]
+
+
+def get_state_checksum(game_state):
+    return zlib.crc32(game_state.encode_key())
+
+
+def pack_moves(moves):
+    codes = [MOVE_CODES[move] for move in moves]
+    if len(codes) % 2:
+        codes.append(0)
+    return bytes(codes[i] | codes[i + 1] << 4 for i in range(0, len(codes), 2))
+
+
+def unpack_moves(data, num_moves):
+    moves = []
+    for byte in data:
+        moves.append(MOVE_NAMES[byte & 0xF])
+        moves.append(MOVE_NAMES[byte >> 4])
+    return moves[:num_moves]
+
+
+class Episode:
+    def __init__(self, board_id, seed, board_digest=None, moves=None, checksums=None):
+        """
+        Args:
+            board_id: level name or board path, as passed to Simulation
+            seed: seed of the game's random generator
+            board_digest: start of the SHA-1 of the board file, to notice when a board changed after recording
+            moves: move names, one per step
+            checksums: CRC-32 of the state after every step, or None if they were not recorded
+        """
+        self.board_id = board_id
+        self.seed = seed
+        self.board_digest = board_digest if board_digest is not None else get_board_digest(board_id)
+        self.moves = moves if moves is not None else []
+        self.checksums = checksums
+
+    def __len__(self):
+        return len(self.moves)
+
+    def to_bytes(self):
+        flags = FLAG_CHECKSUMS if self.checksums is not None else 0
+        board_id = self.board_id.encode()
+        payload = [HEADER_FORMAT.pack(RECORD_MAGIC, flags, self.seed, self.board_digest, len(board_id)), board_id,
+                   STEPS_FORMAT.pack(len(self.moves)), pack_moves(self.moves)]
+        if self.checksums is not None:
+            payload.append(struct.pack('<%dI' % len(self.checksums), *self.checksums))
+        payload = b''.join(payload)
+        return LENGTH_FORMAT.pack(len(payload)) + payload
+
+    @classmethod
+    def from_bytes(cls, payload):
+        magic, flags, seed, board_digest, board_id_length = HEADER_FORMAT.unpack_from(payload)
+        if magic != RECORD_MAGIC:
+            raise ValueError("Not an episode record")
+        offset = HEADER_FORMAT.size
+        board_id = payload[offset:offset + board_id_length].decode()
+        offset += board_id_length
+        num_moves, = STEPS_FORMAT.unpack_from(payload, offset)
+        offset += STEPS_FORMAT.size
+        moves = unpack_moves(payload[offset:offset + (num_moves + 1) // 2], num_moves)
+        offset += (num_moves + 1) // 2
+        checksums = None
+        if flags & FLAG_CHECKSUMS:
+            checksums = list(struct.unpack_from('<%dI' % num_moves, payload, offset))
+        return cls(board_id, seed, board_digest, moves, checksums)
+
+
+class EpisodeRecorder:
+    """
+        Appends the episodes played in a Simulation to a log file. Simulation starts an episode on every reset and
+        get_next_game_state_from_action records every step into it.
+    """
+
+    def __init__(self, path, checksums=False):
+        """
+        Args:
+            path: log file, created if needed and only ever appended to
+            checksums: also store a checksum of the state after every step, so a replay can verify itself
+        """
+        self.path = path
+        self.checksums = checksums
+        self.episode = None
+        self.num_episodes = 0
+        self.board_digests = {}
+
+    def start_episode(self, level, seed=None):
+        """
+            Finish the current episode and start recording a new one
+        Returns:
+            The seed the game's random generator has to be seeded with
+        """
+        self.end_episode()
+        if seed is None:
+            seed = random.getrandbits(64)
+        if level not in self.board_digests:
+            self.board_digests[level] = get_board_digest(level)
+        self.episode = Episode(level, seed, self.board_digests[level], checksums=[] if self.checksums else None)
+        return seed
+
+    def record_step(self, move, game_state):
+        if self.episode is None:
+            return
+        self.episode.moves.append(move)
+        if self.episode.checksums is not None:
+            self.episode.checksums.append(get_state_checksum(game_state))
+
+    def end_episode(self):
+        """
+            Append the current episode to the log, if it has any steps
+        """
+        if self.episode is not None and self.episode.moves:
+            with open(self.path, 'ab') as f:
+                f.write(self.episode.to_bytes())
+            self.num_episodes += 1
+        self.episode = None
+
+
+def read_episodes(path):
+    """
+        Episodes of a log file, oldest first. A record cut short, e.g. by a crash while it was written, ends the log
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + LENGTH_FORMAT.size <= len(data):
+        length, = LENGTH_FORMAT.unpack_from(data, offset)
+        offset += LENGTH_FORMAT.size
+        if offset + length > len(data):
+            break
+        yield Episode.from_bytes(data[offset:offset + length])
+        offset += length
+
+
+def iter_replay(episode):
+    """
+        Simulate a recorded episode again
+    Args:
+        episode (Episode):
+
+    Returns:
+        Generator of (step, GameState, ActionEvent), starting with step 1
+    """
+    if get_board_digest(episode.board_id) != episode.board_digest:
+        raise ValueError("Board %s changed since the episode was recorded" % episode.board_id)
+    simulation = Simulation(episode.board_id)
+    simulation.reset(episode.seed)
+    for step, move in enumerate(episode.moves, 1):
+        game_state, action_event, episode_done = simulation.step(move)
+        if episode.checksums is not None and get_state_checksum(game_state) != episode.checksums[step - 1]:
+            raise ValueError("Replay of %s diverged at step %d" % (episode.board_id, step))
+        yield step, game_state, action_event
+
+
+def replay_episode(episode, step=None):
+    """
+        Rebuild the state of a recorded episode after the given step, the last one if None
+    Returns:
+        (GameState, ActionEvent)
+    """
+    if step == 0:
+        simulation = Simulation(episode.board_id)
+        return simulation.reset(episode.seed), None
+    game_state, action_event = None, None
+    for current_step, game_state, action_event in iter_replay(episode):
+        if current_step == step:
+            break
+    return game_state, action_event
@@ -0,0 +1,79 @@
+import random
+
+from pacman.gamelogic import ActionEvent, get_next_game_state_from_action
+from pacman.initializer import initialize_gamestate_from_file
+
+
+def is_episode_over(action_event):
+    return action_event == ActionEvent.WON or action_event == ActionEvent.LOST
+
+
+class Simulation:
+    """
+        Headless Pac-Man simulation. It has no pygame dependency, so training and other tools can step games
+        without a display; Game only renders and feeds input on top of it.
+    """
+
+    def __init__(self, level=None, recorder=None, transition_cache=None):
+        """
+        Args:
+            recorder (EpisodeRecorder): if given, every episode played is appended to its log
+            transition_cache (TransitionCache): if given, transitions seen before are taken from it instead of
+                being simulated again
+        """
+        self.recorder = recorder
+        self.transition_cache = transition_cache
+        self.level = None
+        self.initial_game_state = None
+        self.game_state = None
+        if level is not None:
+            self.load(level)
+
+    def load(self, level):
+        """
+            Load a level and reset the simulation to its initial state
+        Args:
+            level: name of the board, e.g. 'level-0'
+
+        Returns:
+            GameState
+        """
+        self.level = level
+        self.initial_game_state = initialize_gamestate_from_file(level)
+        return self.reset()
+
+    def reset(self, seed=None):
+        """
+            Start a new episode
+        Args:
+            seed: seed of the game's random choices. Without one the global random generator is used,
+                unless the episode is recorded, in which case the recorder picks a seed
+
+        Returns:
+            GameState
+        """
+        # Only the agents are copied, the board is shared with the initial state
+        self.game_state = self.initial_game_state.get_successor()
+        if self.recorder is not None:
+            seed = self.recorder.start_episode(self.level, seed)
+        self.game_state.rng = random.Random(seed) if seed is not None else None
+        return self.game_state
+
+    def step(self, move):
+        """
+            Advance the simulation by one tick
+        Args:
+            move: "UP", "RIGHT", "DOWN", "LEFT" or "NONE" to keep Pac-Man's current move
+
+        Returns:
+            (GameState, ActionEvent, bool): the new state, what happened and whether the episode is over
+        """
+        if self.transition_cache is not None:
+            self.game_state, action_event = self.transition_cache.step(self.game_state, move, self.recorder)
+        else:
+            self.game_state, action_event = get_next_game_state_from_action(self.game_state, move,
+                                                                            recorder=self.recorder)
+        episode_done = is_episode_over(action_event)
+        if episode_done and self.recorder is not None:
+            self.recorder.end_episode()
+        return self.game_state, action_event, episode_done
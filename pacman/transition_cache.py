@@ -0,0 +1,163 @@
+import struct
+from collections import OrderedDict
+
+from objects.ghost import MODE_PHASE_TABLE, SCATTER
+from pacman.clock import get_phase
+from pacman.gamelogic import get_next_game_state_from_action
+
+TRANSITION_CACHE_SIZE = 100000
+MOVE_CODES = {"UP": 0, "RIGHT": 1, "DOWN": 2, "LEFT": 3, "NONE": 4, None: 5}
+MODE_CODES = {SCATTER: 1}
+
+
+def build_phase_indices(phase_table):
+    """
+        Number the runs of equal phases of a phase table, e.g. [A, A, B, B, A] -> [0, 0, 1, 1, 2]
+    """
+    indices = []
+    for tick, phase in enumerate(phase_table):
+        indices.append(0 if tick == 0 else indices[-1] + (phase != phase_table[tick - 1]))
+    return indices
+
+
+# Ghosts move the same way on every tick of a phase, so their mode clock only matters up to the phase it is in
+PHASE_INDICES = build_phase_indices(MODE_PHASE_TABLE)
+
+
+def get_dynamics_key(game_state):
+    """
+        Everything the next state depends on besides the action, packed into bytes: GameState.encode_key
+        plus Pac-Man's move and lives and each ghost's previous move, mode, target and the phase of its mode clock.
+        Pac-Man's tick count is left out, it only changes the score
+    """
+    pacman = game_state.pacman
+    values = [MOVE_CODES[pacman.current_move], pacman.lives]
+    for ghost in game_state.ghosts:
+        values.extend((MOVE_CODES[ghost.previous_move], MODE_CODES.get(ghost.mode, 0),
+                       ghost.target_position[0], ghost.target_position[1],
+                       get_phase(PHASE_INDICES, ghost.ticks_since_respawn)))
+    return game_state.encode_key() + struct.pack('<Bb' + 'BBhhB' * len(game_state.ghosts), *values)
+
+
+def get_changes(game_state, next_game_state):
+    """
+        What a step changed, enough to build next_game_state again from any state with the same dynamics key
+    Returns:
+        Tuple of Pac-Man's (position, previous position, move, lives), the position of the eaten dot or None and
+        for every ghost its (position, previous position, previous move, mode, target, mode clock after the step
+        if Pac-Man was captured or None if the clock just advanced)
+    """
+    pacman = next_game_state.pacman
+    # A capture is the only way to lose a life and respawns every ghost, before or after its tick. Then the
+    # clock does not continue from the old one, whatever value it ends up with
+    captured = pacman.lives != game_state.pacman.lives
+    eaten_dot = None
+    if next_game_state.dot_mask != game_state.dot_mask:
+        eaten_bit = (game_state.dot_mask ^ next_game_state.dot_mask).bit_length() - 1
+        eaten_dot = game_state.dots[eaten_bit].position
+    ghosts = []
+    for next_ghost in next_game_state.ghosts:
+        ghosts.append((next_ghost.position, next_ghost.previous_position, next_ghost.previous_move, next_ghost.mode,
+                       next_ghost.target_position, next_ghost.ticks_since_respawn if captured else None))
+    return (pacman.position, pacman.previous_position, pacman.current_move, pacman.lives), eaten_dot, tuple(ghosts)
+
+
+def apply_changes(game_state, changes, action_event):
+    """
+        Build the next state of game_state from the result of get_changes
+    Returns:
+        GameState
+    """
+    (position, previous_position, current_move, lives), eaten_dot, ghost_changes = changes
+    next_game_state = game_state.get_successor()
+    pacman = next_game_state.pacman
+    next_game_state.move_agent(pacman, position)
+    pacman.previous_position = previous_position
+    pacman.current_move = current_move
+    pacman.lives = lives
+    pacman.number_of_ticks += 1
+    if eaten_dot is not None:
+        next_game_state.eat_dot_at(eaten_dot)
+    for ghost, (position, previous_position, previous_move, mode, target_position, ticks) in zip(
+            next_game_state.ghosts, ghost_changes):
+        next_game_state.move_agent(ghost, position)
+        ghost.previous_position = previous_position
+        ghost.previous_move = previous_move
+        ghost.mode = mode
+        ghost.target_position = target_position
+        ghost.ticks_since_respawn = ghost.ticks_since_respawn + 1 if ticks is None else ticks
+    next_game_state.last_game_event = action_event
+    return next_game_state
+
+
+def uses_randomness(game_state, next_game_state):
+    # A ghost that starts to scatter picks a random corner, see Ghost.set_mode
+    return any(next_ghost.mode == SCATTER and ghost.mode != SCATTER
+               for ghost, next_ghost in zip(game_state.ghosts, next_game_state.ghosts))
+
+
+class TransitionCache:
+    """
+        Memoizes get_next_game_state_from_action for one board. A transition seen before is answered from an LRU
+        cache keyed by get_dynamics_key and the action, without simulating it again. Transitions that involve a
+        random choice are always simulated and never cached.
+
+        An entry holds the key and what the step changed, see get_changes, not the next state itself. On a board
+        with G ghosts and D dots that is about 450 + 170 * G + D / 8 bytes, so with 4 ghosts the default capacity
+        needs about 120 MB at most.
+    """
+
+    def __init__(self, capacity=TRANSITION_CACHE_SIZE):
+        self.capacity = capacity
+        # (dynamics key, action) -> (get_changes of the step, ActionEvent), least recently used first
+        self.transitions = OrderedDict()
+        self.zobrist = None
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+
+    def __len__(self):
+        return len(self.transitions)
+
+    def get_hit_rate(self):
+        lookups = self.hits + self.misses + self.uncacheable
+        return self.hits / lookups if lookups else 0.0
+
+    def get_statistics(self):
+        return {'size': len(self.transitions), 'hits': self.hits, 'misses': self.misses,
+                'uncacheable': self.uncacheable, 'hit_rate': self.get_hit_rate()}
+
+    def clear(self):
+        self.transitions.clear()
+
+    def step(self, game_state, action, recorder=None):
+        """
+            Same as get_next_game_state_from_action(game_state, action, recorder=recorder)
+        Returns:
+            (GameState, ActionEvent)
+        """
+        if game_state.zobrist is not self.zobrist:
+            # Keys only identify states within one board. Every copy of a board's states shares its Zobrist table
+            self.clear()
+            self.zobrist = game_state.zobrist
+
+        key = get_dynamics_key(game_state), action
+        cached = self.transitions.get(key)
+        if cached is None:
+            next_game_state, action_event = get_next_game_state_from_action(game_state, action, recorder=recorder)
+            if uses_randomness(game_state, next_game_state):
+                self.uncacheable += 1
+            else:
+                self.misses += 1
+                self.transitions[key] = get_changes(game_state, next_game_state), action_event
+                if len(self.transitions) > self.capacity:
+                    self.transitions.popitem(last=False)
+            return next_game_state, action_event
+
+        self.hits += 1
+        self.transitions.move_to_end(key)
+        changes, action_event = cached
+        next_game_state = apply_changes(game_state, changes, action_event)
+        if recorder is not None:
+            recorder.record_step(action, next_game_state)
+        return next_game_state, action_event
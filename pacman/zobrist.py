@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+
+ZOBRIST_SEED = 20190312
+
+
+def generate_zobrist_keys(num_cells, num_agents, num_dots, seed=ZOBRIST_SEED):
+    """
+        Seeded, so every process that loads the same board gets the same keys
+    Returns:
+        (agent keys, dot keys): uint64 arrays of shape (num_agents, num_cells) and (num_dots,)
+    """
+    rng = random.Random(seed)
+    agent_keys = np.array([[rng.getrandbits(64) for _ in range(num_cells)] for _ in range(num_agents)],
+                          dtype=np.uint64).reshape(num_agents, num_cells)
+    dot_keys = np.array([rng.getrandbits(64) for _ in range(num_dots)], dtype=np.uint64)
+    return agent_keys, dot_keys
+
+
+class ZobristTable:
+    """
+        Random 64-bit keys for every (agent, open cell) pair and for every dot of a board.
+        The hash of a game state is the XOR of the keys of everything on the board, so a move or an
+        eaten dot only needs one or two XORs to update it.
+    """
+
+    def __init__(self, cells, agent_keys, dot_keys):
+        """
+        Args:
+            cells: the open cells of the board, as (x, y) tuples. Agents never stand on walls
+            agent_keys, dot_keys: see generate_zobrist_keys, agent_keys[agent][i] is the key of cells[i]
+        """
+        self.agent_keys = [dict(zip(cells, keys)) for keys in agent_keys.tolist()]
+        self.dot_keys = dot_keys.tolist()
+        self.dot_key_array = dot_keys
+
+    def __deepcopy__(self, memo):
+        # The keys never change, so copies of a game state can share the table
+        return self
+
+    def get_agent_key(self, agent_index, position):
+        try:
+            return self.agent_keys[agent_index][position]
+        except KeyError:
+            raise ValueError("Position %s of agent %d is not on the board" % (position, agent_index)) from None
+
+    def get_dot_key(self, bit):
+        return self.dot_keys[bit]
+
+    def hash_game_state(self, gamestate):
+        """
+            Compute the hash of a game state from scratch
+        Args:
+            gamestate (GameState):
+
+        Returns:
+            int
+        """
+        state_hash = 0
+        for agent_index, agent in enumerate(gamestate.get_agents()):
+            state_hash ^= self.get_agent_key(agent_index, agent.position)
+        num_dots = len(self.dot_keys)
+        mask_bytes = np.frombuffer(gamestate.dot_mask.to_bytes((num_dots + 7) // 8, 'little'), dtype=np.uint8)
+        active_dots = np.unpackbits(mask_bytes, bitorder='little')[:num_dots].astype(np.bool_)
+        return state_hash ^ int(np.bitwise_xor.reduce(self.dot_key_array[active_dots]))
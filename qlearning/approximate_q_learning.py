@@ -0,0 +1,222 @@
+import random
+from collections import OrderedDict
+
+import numpy as np
+
+import utils.moves as moves
+from pacman.actions import Action
+from pacman.distances import UNREACHABLE
+from pacman.gamelogic import ActionEvent
+from pacman.profiler import get_profiler
+from pacman.simulation import Simulation
+from qlearning.q_learning import calculate_reward_for_move
+
+FEATURE_NAMES = ('bias', 'hits_wall', 'eats_dot', 'nearest_dot_distance', 'ghosts_one_step_away',
+                 'nearest_ghost_distance', 'dots_left', 'legal_moves')
+NUM_FEATURES = len(FEATURE_NAMES)
+# Ghosts further away than this many moves all look the same
+GHOST_DISTANCE_HORIZON = 10
+WEIGHTS_FILE_SUFFIX = '.weights.npy'
+# Boards whose BoardFeatures a FeatureExtractor keeps, the least recently used one is dropped first
+BOARD_CACHE_SIZE = 16
+
+
+class BoardFeatures:
+    """
+        Data of a board that every feature vector needs, computed once per board
+    """
+
+    def __init__(self, game_state):
+        self.distances = game_state.distances
+        self.num_dots = len(game_state.dots)
+        self.num_mask_bytes = (self.num_dots + 7) // 8
+        # Distance map cell of every dot, indexed by dot bit
+        self.dot_cells = np.array([self.distances.cell_index[dot.position] for dot in game_state.dots],
+                                  dtype=np.int64)
+        self.max_distance = max(len(self.distances.cells), 1)
+
+    def get_active_dots(self, dot_mask):
+        """
+            Boolean array with a flag per dot, True while it has not been eaten
+        """
+        mask_bytes = np.frombuffer(dot_mask.to_bytes(self.num_mask_bytes, 'little'), dtype=np.uint8)
+        return np.unpackbits(mask_bytes, bitorder='little')[:self.num_dots].astype(np.bool_)
+
+
+class FeatureExtractor:
+    """
+        Turns a game state into a (len(Action), NUM_FEATURES) matrix: for every action the features of the cell
+        Pac-Man ends up on, see FEATURE_NAMES. All features are scaled to about [0, 1], so one weight vector works
+        on boards of any size.
+    """
+
+    def __init__(self, board_cache_size=BOARD_CACHE_SIZE):
+        self.board_cache_size = board_cache_size
+        self.boards = OrderedDict()
+
+    def get_board(self, game_state):
+        key = id(game_state.distances)
+        board = self.boards.get(key)
+        if board is None or board.distances is not game_state.distances:
+            board = self.boards[key] = BoardFeatures(game_state)
+            if len(self.boards) > self.board_cache_size:
+                self.boards.popitem(last=False)
+        self.boards.move_to_end(key)
+        return board
+
+    def get_features(self, game_state):
+        board = self.get_board(game_state)
+        position = game_state.pacman.position
+        active_dots = board.get_active_dots(game_state.dot_mask)
+        active_dot_cells = board.dot_cells[active_dots]
+        ghost_positions = [ghost.position for ghost in game_state.ghosts]
+        ghost_cells = np.array([board.distances.cell_index[ghost_position] for ghost_position in ghost_positions
+                                if ghost_position in board.distances.cell_index], dtype=np.int64)
+        dots_left = game_state.num_dots_left / max(board.num_dots, 1)
+
+        features = np.zeros((len(Action), NUM_FEATURES), dtype=np.float32)
+        features[:, 0] = 1
+        features[:, 6] = dots_left
+        for action in Action:
+            direction = moves.DIRECTION_FROM_MOVE[action.name]
+            next_position = position[0] + direction[0], position[1] + direction[1]
+            row = features[action.value]
+            if game_state.is_wall(next_position):
+                row[1] = 1
+                next_position = position
+
+            distances = board.distances.get_distances_from(next_position)
+            if distances is None:
+                continue
+            if len(active_dot_cells):
+                dot_distances = distances[active_dot_cells]
+                nearest_dot = dot_distances.min()
+                row[2] = nearest_dot == 0
+                if nearest_dot != UNREACHABLE:
+                    row[3] = nearest_dot / board.max_distance
+            if len(ghost_cells):
+                ghost_distances = distances[ghost_cells]
+                row[4] = (ghost_distances <= 1).sum()
+                row[5] = min(int(ghost_distances.min()), GHOST_DISTANCE_HORIZON) / GHOST_DISTANCE_HORIZON
+            else:
+                row[5] = 1
+            row[7] = len(game_state.navigation.get_exits(next_position, None)) / len(Action)
+        return features
+
+
+class ApproximateQLearn:
+    """
+        Q-learning with a linear function of state features instead of a table: Q(s, a) = features(s, a) . weights.
+        Memory does not depend on the number of states, and what is learned on one board carries over to others.
+
+        Transitions are collected into a fixed-size batch and the weights are updated for the whole batch at once.
+    """
+
+    def __init__(self, weights=None, feature_extractor=None, batch_size=32, exploration_prob=0.2):
+        self.weights = weights if weights is not None else np.zeros(NUM_FEATURES, dtype=np.float32)
+        self.feature_extractor = feature_extractor if feature_extractor is not None else FeatureExtractor()
+        self.batch_size = batch_size
+        self.exploration_prob = exploration_prob
+        self.batch_features = np.zeros((batch_size, NUM_FEATURES), dtype=np.float32)
+        self.batch_rewards = np.zeros(batch_size, dtype=np.float32)
+        self.batch_next_features = np.zeros((batch_size, len(Action), NUM_FEATURES), dtype=np.float32)
+        self.batch_dones = np.zeros(batch_size, dtype=np.bool_)
+        self.batch_length = 0
+
+    def get_q_values(self, game_state, features=None):
+        if features is None:
+            features = self.feature_extractor.get_features(game_state)
+        return features @ self.weights
+
+    def pick_optimal_action(self, game_state, features=None):
+        q_values = self.get_q_values(game_state, features)
+        return Action(random.choice(np.flatnonzero(q_values == q_values.max())))
+
+    def pick_action(self, game_state, features=None):
+        if self.exploration_prob > np.random.rand():
+            return np.random.choice(Action.get_all_actions())
+        return self.pick_optimal_action(game_state, features)
+
+    def add_transition(self, features, reward, next_features, done, discount, alpha):
+        """
+            Queue a transition, and update the weights once the batch is full
+        Args:
+            features: features of the state and the action taken
+            next_features: feature matrix of the next state
+        """
+        i = self.batch_length
+        self.batch_features[i] = features
+        self.batch_rewards[i] = reward
+        self.batch_next_features[i] = next_features
+        self.batch_dones[i] = done
+        self.batch_length += 1
+        if self.batch_length == self.batch_size:
+            self.update_weights(discount, alpha)
+
+    def update_weights(self, discount=0.8, alpha=0.01):
+        """
+            One gradient step on the queued transitions
+        Returns:
+            Their TD errors
+        """
+        n = self.batch_length
+        if n == 0:
+            return np.zeros(0, dtype=np.float32)
+        features = self.batch_features[:n]
+        max_next_q_values = (self.batch_next_features[:n] @ self.weights).max(axis=1)
+        max_next_q_values[self.batch_dones[:n]] = 0
+        td_errors = self.batch_rewards[:n] + discount * max_next_q_values - features @ self.weights
+        self.weights += alpha * (td_errors @ features) / n
+        self.batch_length = 0
+        return td_errors
+
+    def run_episode(self, simulation, discount=0.8, alpha=0.01):
+        """
+            Play one episode from the start of the level, learning from every step
+        Returns:
+            (GameState, ActionEvent, float): the final state, the event that ended the episode and the total reward
+        """
+        profiler = get_profiler()
+        current_game_state = simulation.reset()
+        features = self.feature_extractor.get_features(current_game_state)
+        score = 0
+        episode_done = False
+        while not episode_done:
+            with profiler.phase('pick_action'):
+                action = self.pick_action(current_game_state, features)
+            with profiler.phase('step'):
+                new_game_state, action_event, episode_done = simulation.step(action.name)
+
+            reward = calculate_reward_for_move(action_event)
+            score += reward
+
+            with profiler.phase('q_update'):
+                next_features = self.feature_extractor.get_features(new_game_state)
+                self.add_transition(features[action.value], reward, next_features, episode_done, discount, alpha)
+
+            current_game_state, features = new_game_state, next_features
+        self.update_weights(discount, alpha)
+        profiler.count('episodes')
+        return current_game_state, action_event, score
+
+    def train(self, level='level-0', num_episodes=10, model_path='./approximate_q'):
+        simulation = Simulation(level)
+        for i in range(num_episodes):
+            print("Episode number ", i)
+            current_game_state, action_event, episode_score = self.run_episode(simulation)
+            if action_event == ActionEvent.WON:
+                print("Won!!")
+            elif action_event == ActionEvent.LOST:
+                print("Lost!!")
+            print("Score:", current_game_state.calculate_score())
+        save_weights(model_path, self.weights)
+
+
+def save_weights(file_path_without_extension, weights, feedback=True):
+    np.save(file_path_without_extension + WEIGHTS_FILE_SUFFIX, weights)
+    if feedback:
+        print('Done saving weights %s' % file_path_without_extension)
+
+
+def load_weights(file_path_without_extension):
+    return np.load(file_path_without_extension + WEIGHTS_FILE_SUFFIX)
@@ -0,0 +1,228 @@
+import numpy as np
+
+from objects.ghost import MODE_PHASE_TABLE, SCATTER
+from pacman.actions import Action
+from pacman.distances import UNREACHABLE
+from pacman.gamelogic import ActionEvent
+from pacman.initializer import initialize_gamestate_from_file
+from qlearning.q_learning import calculate_reward_for_move
+
+# Moves are indexed by Action value, with NONE after the four real moves
+NO_MOVE = len(Action)
+DIRECTIONS = np.array([(0, -1), (1, 0), (0, 1), (-1, 0), (0, 0)], dtype=np.int32)
+OPPOSITE_MOVES = np.array([Action.DOWN.value, Action.LEFT.value, Action.UP.value, Action.RIGHT.value, NO_MOVE])
+# Order in which ghosts break ties between equally good moves, see navigation.MOVE_PRIORITY
+GHOST_MOVE_PRIORITY = np.array([Action.UP.value, Action.LEFT.value, Action.DOWN.value, Action.RIGHT.value])
+
+CHASE_MODE = 0
+SCATTER_MODE = 1
+GHOST_MODE_TABLE = np.array([SCATTER_MODE if mode == SCATTER else CHASE_MODE for mode in MODE_PHASE_TABLE])
+
+
+class BatchEnvironment:
+    """
+        N independent games of the same level stepped together. Every game is a row in a set of NumPy arrays
+        and every rule of gamelogic.get_next_game_state_from_action is applied to all rows at once.
+
+        The only difference with the scalar game is the random corner a ghost picks when it starts to scatter,
+        which comes from this environment's own random generator.
+
+        Ghosts look up their maze distances for all games at once. Only the distance fields of the cells ghosts
+        target are computed, see get_maze_distances, so the level does not need its whole distance matrix.
+    """
+
+    def __init__(self, level, num_games, seed=None):
+        game_state = initialize_gamestate_from_file(level)
+        self.num_games = num_games
+        self.random = np.random.default_rng(seed)
+
+        # Every position agents cannot enter, which includes the ring around the board. Positions at -1 wrap
+        # around to the ring on the far side
+        blocked = [(x, y) for x, y in game_state.wall_index if x >= 0 and y >= 0]
+        rows, columns = max(y for x, y in blocked) + 1, max(x for x, y in blocked) + 1
+        self.walls = np.zeros((rows, columns), dtype=np.bool_)
+        for x, y in blocked:
+            self.walls[y, x] = True
+        # Index of the dot on every cell, -1 if there is none
+        self.dot_index = np.full((rows, columns), -1, dtype=np.int32)
+        for (x, y), bit in game_state.dot_bits.items():
+            self.dot_index[y, x] = bit
+        # Index of every open cell in the distance fields of self.distances, -1 for walls
+        self.cell_index = np.full((rows, columns), -1, dtype=np.int32)
+        for (x, y), cell in game_state.distances.cell_index.items():
+            self.cell_index[y, x] = cell
+        self.distances = game_state.distances
+        self.corners = np.array(game_state.get_corners(), dtype=np.int32)
+        self.reward_by_event = np.zeros(max(event.value for event in ActionEvent) + 1, dtype=np.float32)
+        for event in ActionEvent:
+            self.reward_by_event[event.value] = calculate_reward_for_move(event)
+
+        self.pacman_respawn_position = np.array(game_state.pacman.respawn_position, dtype=np.int32)
+        self.ghost_respawn_positions = np.array([ghost.respawn_position for ghost in game_state.ghosts],
+                                                dtype=np.int32).reshape(-1, 2)
+        self.initial_lives = game_state.pacman.lives
+        self.initial_ghost_target = game_state.ghosts[0].target_position if game_state.ghosts else (0, 0)
+        self.num_ghosts = len(game_state.ghosts)
+        self.num_dots = len(game_state.dots)
+
+        self.pacman_positions = np.zeros((num_games, 2), dtype=np.int32)
+        self.pacman_moves = np.zeros(num_games, dtype=np.int32)
+        self.pacman_ticks = np.zeros(num_games, dtype=np.int32)
+        self.lives = np.zeros(num_games, dtype=np.int32)
+        self.dots = np.zeros((num_games, self.num_dots), dtype=np.bool_)
+        self.num_dots_left = np.zeros(num_games, dtype=np.int32)
+        self.ghost_positions = np.zeros((num_games, self.num_ghosts, 2), dtype=np.int32)
+        self.ghost_previous_moves = np.zeros((num_games, self.num_ghosts), dtype=np.int32)
+        self.ghost_ticks = np.zeros((num_games, self.num_ghosts), dtype=np.int32)
+        self.ghost_modes = np.zeros((num_games, self.num_ghosts), dtype=np.int32)
+        self.ghost_targets = np.zeros((num_games, self.num_ghosts, 2), dtype=np.int32)
+        self.reset()
+
+    def reset(self, games=None):
+        """
+            Put games back to the start of the level
+        Args:
+            games: boolean mask or indices of the games to reset, all games if None
+
+        Returns:
+            Observations of all games
+        """
+        if games is None:
+            games = slice(None)
+        self.pacman_positions[games] = self.pacman_respawn_position
+        self.pacman_moves[games] = NO_MOVE
+        self.pacman_ticks[games] = 0
+        self.lives[games] = self.initial_lives
+        self.dots[games] = True
+        self.num_dots_left[games] = self.num_dots
+        self.ghost_positions[games] = self.ghost_respawn_positions
+        self.ghost_previous_moves[games] = NO_MOVE
+        self.ghost_ticks[games] = 0
+        self.ghost_modes[games] = CHASE_MODE
+        self.ghost_targets[games] = self.initial_ghost_target
+        return self.observe()
+
+    def observe(self):
+        """
+            One row per game with Pac-Man's (x, y), the (x, y) of every ghost and a flag per remaining dot,
+            the same information as GameState.get_key
+        """
+        return np.concatenate([self.pacman_positions,
+                               self.ghost_positions.reshape(self.num_games, -1),
+                               self.dots], axis=1).astype(np.int16)
+
+    def is_wall(self, positions):
+        return self.walls[positions[..., 1], positions[..., 0]]
+
+    def get_cells(self, positions):
+        """
+            Cell index of every position, -1 for walls and positions off the board
+        """
+        x, y = positions[..., 0], positions[..., 1]
+        rows, columns = self.cell_index.shape
+        on_board = (x >= 0) & (x < columns) & (y >= 0) & (y < rows)
+        return np.where(on_board, self.cell_index[np.where(on_board, y, 0), np.where(on_board, x, 0)], -1)
+
+    def get_maze_distances(self, target_cells, cells):
+        """
+            Maze distances from targets to cells. The distance field of every distinct target is computed once and
+            kept in the LRU cache of self.distances
+        Args:
+            target_cells: array of cell indices, -1 for targets that are not open cells
+            cells: array of cell indices with one more axis than target_cells, -1 for positions that are not open
+
+        Returns:
+            Array shaped like cells, distances[i, j] is from target_cells[i] to cells[i, j], UNREACHABLE where
+            either is not an open cell
+        """
+        targets = target_cells.ravel()
+        cells = cells.reshape(len(targets), -1)
+        distances = np.full(cells.shape, UNREACHABLE, dtype=np.int64)
+        unique_targets, inverse, counts = np.unique(targets, return_inverse=True, return_counts=True)
+        groups = np.split(np.argsort(inverse, kind='stable'), np.cumsum(counts)[:-1])
+        for target, group in zip(unique_targets.tolist(), groups):
+            if target >= 0:
+                distances[group] = self.distances.get_distances_from(self.distances.cells[target])[cells[group]]
+        distances[cells < 0] = UNREACHABLE
+        return distances.reshape(target_cells.shape + (-1,))
+
+    def step(self, actions):
+        """
+            Advance every game by one tick. Games that end are reset, so the batch always holds running games
+        Args:
+            actions: array of shape (num_games,) with Action values
+
+        Returns:
+            (observations, rewards, dones, events): the events are ActionEvent values
+        """
+        actions = np.asarray(actions, dtype=np.int32)
+        self.pacman_moves = np.where(actions == NO_MOVE, self.pacman_moves, actions)
+
+        new_positions = self.pacman_positions + DIRECTIONS[self.pacman_moves]
+        crashed = self.is_wall(new_positions)
+        self.pacman_positions = np.where(crashed[:, None], self.pacman_positions, new_positions)
+        events = np.where(crashed, ActionEvent.WALL.value, ActionEvent.NONE.value)
+
+        dots = self.dot_index[self.pacman_positions[:, 1], self.pacman_positions[:, 0]]
+        games = np.flatnonzero(dots >= 0)
+        games = games[self.dots[games, dots[games]]]
+        self.dots[games, dots[games]] = False
+        self.num_dots_left[games] -= 1
+        events[games] = ActionEvent.DOT.value
+        self.pacman_ticks += 1
+
+        self.check_ghost_collisions(events)
+        self.move_ghosts()
+        self.check_ghost_collisions(events)
+
+        won = (self.num_dots_left == 0) & (self.lives > 0)
+        events[won] = ActionEvent.WON.value
+        lost = self.lives <= 0
+        events[lost] = ActionEvent.LOST.value
+
+        rewards = self.reward_by_event[events]
+        dones = won | lost
+        if dones.any():
+            self.reset(dones)
+        return self.observe(), rewards, dones, events
+
+    def check_ghost_collisions(self, events):
+        captured = (self.ghost_positions == self.pacman_positions[:, None, :]).all(axis=2).any(axis=1)
+        events[captured] = ActionEvent.CAPTURED_BY_GHOST.value
+        self.lives[captured] -= 1
+        self.ghost_positions[captured] = self.ghost_respawn_positions
+        self.ghost_ticks[captured] = 0
+        self.pacman_positions[captured] = self.pacman_respawn_position
+        self.pacman_moves[captured] = NO_MOVE
+
+    def move_ghosts(self):
+        # Mode changes, see Ghost.set_mode
+        modes = GHOST_MODE_TABLE[np.minimum(self.ghost_ticks, len(GHOST_MODE_TABLE) - 1)]
+        changed = modes != self.ghost_modes
+        scatter = changed & (modes == SCATTER_MODE)
+        self.ghost_targets[scatter] = self.corners[self.random.integers(len(self.corners), size=scatter.sum())]
+        self.ghost_modes[scatter] = SCATTER_MODE
+        chase = changed & (modes == CHASE_MODE)
+        pacman_positions = np.broadcast_to(self.pacman_positions[:, None, :], self.ghost_positions.shape)
+        self.ghost_targets[chase] = pacman_positions[chase]
+
+        # Closest open cell to the target, without turning back, see GhostNavigation.choose_move
+        candidates = self.ghost_positions[:, :, None, :] + DIRECTIONS[GHOST_MOVE_PRIORITY]
+        allowed = ~self.is_wall(candidates)
+        allowed &= OPPOSITE_MOVES[GHOST_MOVE_PRIORITY] != self.ghost_previous_moves[:, :, None]
+        # Maze distance where the target is reachable, the squared straight line distance otherwise
+        candidate_cells = self.get_cells(candidates)
+        maze_distances = self.get_maze_distances(self.get_cells(self.ghost_targets), candidate_cells)
+        in_maze = maze_distances != UNREACHABLE
+        straight_distances = ((candidates - self.ghost_targets[:, :, None, :]) ** 2).sum(axis=3)
+        distances = np.where(in_maze, maze_distances, straight_distances)
+        distances = np.where(allowed, distances, np.iinfo(np.int32).max)
+        moves = GHOST_MOVE_PRIORITY[distances.argmin(axis=2)]
+        # A ghost in a dead end turns back
+        moves = np.where(allowed.any(axis=2), moves, OPPOSITE_MOVES[self.ghost_previous_moves])
+
+        new_positions = self.ghost_positions + DIRECTIONS[moves]
+        blocked = self.is_wall(new_positions)
+        self.ghost_positions = np.where(blocked[..., None], self.ghost_positions, new_positions)
+        self.ghost_previous_moves = moves
+        self.ghost_ticks += 1
@@ -0,0 +1,393 @@
+"""
+    Local server that hosts many Pac-Man simulations for agents in other processes, e.g.
+
+        python -m qlearning.env_server --unix /tmp/pacman.sock
+
+    Every message is a uint32 length followed by a uint32 request id, chosen by the client, and a payload. A
+    request payload starts with a uint8 opcode:
+
+        OPEN       uint64 seed, uint8 flags (FLAG_SEED), uint16 length + UTF-8 name of a board in boards/
+        RESET      uint32 environment id, uint8 flags (FLAG_SEED), uint64 seed
+        STEP       uint32 environment id, uint8 move (Action.value, or MOVE_NONE to keep the current move)
+        STEP_MANY  uint16 count, then count times uint32 environment id + uint8 move
+        CLOSE      uint32 environment id
+
+    A response payload starts with a uint8 status. STATUS_ERROR is followed by a uint16 length + UTF-8 message.
+    STATUS_OK is followed by, for OPEN the uint32 environment id and an observation, for RESET and STEP an
+    observation, for STEP_MANY a uint16 count and that many observations, and for CLOSE nothing.
+
+    An observation is uint8 ActionEvent value (0 after a reset), uint8 done, float32 reward, int32 score,
+    int8 lives, uint16 length + GameState.encode_key.
+
+    A response carries the id of its request, so a client may send many requests before reading the responses
+    and match them up by id. The requests of all connections go through one bounded queue and are handled in
+    batches. When the queue is full, the server stops reading from connections, and it stops reading from a
+    connection that does not read its responses.
+"""
+import argparse
+import asyncio
+import copy
+import os
+import struct
+
+from pacman.actions import Action
+from pacman.board_compiler import BOARD_DIRECTORY, load_board
+from pacman.initializer import get_board_path
+from pacman.simulation import Simulation
+from qlearning.q_learning import calculate_reward_for_move
+
+OPEN = 1
+RESET = 2
+STEP = 3
+STEP_MANY = 4
+CLOSE = 5
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+FLAG_SEED = 1
+
+MOVE_NONE = len(Action)
+MOVE_NAMES = [action.name for action in sorted(Action, key=lambda action: action.value)] + ["NONE"]
+
+LENGTH_FORMAT = struct.Struct('<I')
+REQUEST_ID_FORMAT = struct.Struct('<I')
+OPEN_FORMAT = struct.Struct('<QBH')
+RESET_FORMAT = struct.Struct('<IBQ')
+STEP_FORMAT = struct.Struct('<IB')
+COUNT_FORMAT = struct.Struct('<H')
+ENVIRONMENT_FORMAT = struct.Struct('<I')
+OBSERVATION_FORMAT = struct.Struct('<BBfibH')
+
+# Requests waiting to be handled, over all connections
+MAX_PENDING_REQUESTS = 4096
+# Requests of one connection that may wait for their response
+MAX_REQUESTS_IN_FLIGHT = 256
+MAX_BATCH_SIZE = 512
+
+
+class RequestError(Exception):
+    """
+        A request that cannot be handled, reported to the client instead of stopping the server
+    """
+
+
+def pack_observation(game_state, action_event=None, done=False):
+    key = game_state.encode_key()
+    reward = calculate_reward_for_move(action_event) if action_event is not None else 0
+    return OBSERVATION_FORMAT.pack(action_event.value if action_event is not None else 0, done, reward,
+                                   game_state.calculate_score(), game_state.pacman.lives, len(key)) + key
+
+
+def unpack_observation(data, offset=0):
+    """
+    Returns:
+        ((event, done, reward, score, lives, key), offset after the observation)
+    """
+    event, done, reward, score, lives, key_length = OBSERVATION_FORMAT.unpack_from(data, offset)
+    offset += OBSERVATION_FORMAT.size
+    key = bytes(data[offset:offset + key_length])
+    return (event, bool(done), reward, score, lives, key), offset + key_length
+
+
+def is_board_name(level):
+    # Clients may only open the boards in boards/, not any file the server can read
+    return level + '.txt' in os.listdir(BOARD_DIRECTORY)
+
+
+def pack_error(message):
+    message = message.encode()
+    return bytes([STATUS_ERROR]) + COUNT_FORMAT.pack(len(message)) + message
+
+
+class EnvironmentServer:
+    """
+        Simulations of many games, driven by binary requests, see the module documentation
+    """
+
+    def __init__(self, max_pending_requests=MAX_PENDING_REQUESTS, max_batch_size=MAX_BATCH_SIZE,
+                 max_requests_in_flight=MAX_REQUESTS_IN_FLIGHT):
+        self.max_pending_requests = max_pending_requests
+        self.max_batch_size = max_batch_size
+        self.max_requests_in_flight = max_requests_in_flight
+        self.environments = {}
+        self.next_environment_id = 0
+        # A loaded Simulation per level, copied for every environment of that level
+        self.templates = {}
+        self.requests = None
+        self.processor = None
+        self.num_requests = 0
+        self.num_batches = 0
+
+    def get_environment(self, environment_id):
+        simulation = self.environments.get(environment_id)
+        if simulation is None:
+            raise RequestError("No environment %d" % environment_id)
+        return simulation
+
+    def open_environment(self, level, seed):
+        """
+            Nothing is registered before the environment is ready, so an OPEN that fails leaves no trace
+        Returns:
+            (environment id, packed observation of the first state)
+        """
+        template = self.templates.get(level)
+        if template is None:
+            if not is_board_name(level):
+                raise RequestError("No level %s" % level)
+            try:
+                if load_board(get_board_path(level)).get_pacman_position() is None:
+                    raise RequestError("Level %s has no Pac-Man" % level)
+                template = Simulation(level)
+            except OSError:
+                raise RequestError("No level %s" % level)
+            self.templates[level] = template
+        simulation = copy.copy(template)
+        observation = pack_observation(simulation.reset(seed))
+        environment_id = self.next_environment_id
+        self.next_environment_id += 1
+        self.environments[environment_id] = simulation
+        return environment_id, observation
+
+    def step(self, environment_id, move):
+        if move > MOVE_NONE:
+            raise RequestError("No move %d" % move)
+        game_state, action_event, done = self.get_environment(environment_id).step(MOVE_NAMES[move])
+        return pack_observation(game_state, action_event, done)
+
+    def handle_request(self, request):
+        """
+            Handle one request payload
+        Returns:
+            The response payload
+        """
+        opcode = request[0]
+        try:
+            if opcode == OPEN:
+                seed, flags, level_length = OPEN_FORMAT.unpack_from(request, 1)
+                level = bytes(request[1 + OPEN_FORMAT.size:1 + OPEN_FORMAT.size + level_length]).decode()
+                environment_id, observation = self.open_environment(level, seed if flags & FLAG_SEED else None)
+                return bytes([STATUS_OK]) + ENVIRONMENT_FORMAT.pack(environment_id) + observation
+            if opcode == RESET:
+                environment_id, flags, seed = RESET_FORMAT.unpack_from(request, 1)
+                game_state = self.get_environment(environment_id).reset(seed if flags & FLAG_SEED else None)
+                return bytes([STATUS_OK]) + pack_observation(game_state)
+            if opcode == STEP:
+                return bytes([STATUS_OK]) + self.step(*STEP_FORMAT.unpack_from(request, 1))
+            if opcode == STEP_MANY:
+                count, = COUNT_FORMAT.unpack_from(request, 1)
+                steps = list(STEP_FORMAT.iter_unpack(request[1 + COUNT_FORMAT.size:1 + COUNT_FORMAT.size +
+                                                             count * STEP_FORMAT.size]))
+                if len(steps) != count:
+                    raise RequestError("Expected %d steps, got %d" % (count, len(steps)))
+                # Check every step first, so a bad one does not leave the batch half done
+                for environment_id, move in steps:
+                    self.get_environment(environment_id)
+                    if move > MOVE_NONE:
+                        raise RequestError("No move %d" % move)
+                return b''.join([bytes([STATUS_OK]), COUNT_FORMAT.pack(count)] +
+                                [self.step(environment_id, move) for environment_id, move in steps])
+            if opcode == CLOSE:
+                environment_id, = ENVIRONMENT_FORMAT.unpack_from(request, 1)
+                self.get_environment(environment_id)
+                del self.environments[environment_id]
+                return bytes([STATUS_OK])
+            raise RequestError("Unknown opcode %d" % opcode)
+        except (RequestError, struct.error, UnicodeDecodeError) as error:
+            return pack_error(str(error))
+
+    async def process_requests(self):
+        """
+            Handle queued requests in batches: wait for one, then take every other request that is already
+            waiting, up to max_batch_size, before giving the connections a chance to run again
+        """
+        while True:
+            batch = [await self.requests.get()]
+            while len(batch) < self.max_batch_size and not self.requests.empty():
+                batch.append(self.requests.get_nowait())
+            for request, response in batch:
+                try:
+                    payload = self.handle_request(request)
+                except Exception as error:
+                    # e.g. a board without Pac-Man. Keep serving the other environments
+                    payload = pack_error("%s: %s" % (type(error).__name__, error))
+                if not response.cancelled():
+                    response.set_result(payload)
+            self.num_requests += len(batch)
+            self.num_batches += 1
+
+    async def handle_connection(self, reader, writer):
+        # (request id, future of the response) of this connection, in request order
+        responses = asyncio.Queue(self.max_requests_in_flight)
+        sender = asyncio.ensure_future(self.send_responses(responses, writer))
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    length, = LENGTH_FORMAT.unpack(await reader.readexactly(LENGTH_FORMAT.size))
+                    request = await reader.readexactly(length)
+                except asyncio.IncompleteReadError:
+                    break
+                if len(request) < REQUEST_ID_FORMAT.size:
+                    break
+                request_id, = REQUEST_ID_FORMAT.unpack_from(request)
+                response = loop.create_future()
+                # Both queues are bounded, so a client that sends faster than it is served has to wait here
+                await responses.put((request_id, response))
+                await self.requests.put((request[REQUEST_ID_FORMAT.size:], response))
+            await responses.put(None)
+            await sender
+        except ConnectionError:
+            pass
+        finally:
+            sender.cancel()
+            writer.close()
+
+    async def send_responses(self, responses, writer):
+        while True:
+            pending = await responses.get()
+            if pending is None:
+                return
+            request_id, response = pending
+            payload = await response
+            writer.write(LENGTH_FORMAT.pack(REQUEST_ID_FORMAT.size + len(payload)) +
+                         REQUEST_ID_FORMAT.pack(request_id) + payload)
+            # Stop here while the client does not read its responses
+            await writer.drain()
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        """
+            Listen on a Unix socket if path is given, otherwise on TCP
+        Returns:
+            asyncio.Server
+        """
+        self.requests = asyncio.Queue(self.max_pending_requests)
+        self.processor = asyncio.ensure_future(self.process_requests())
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+class EnvironmentClient:
+    """
+        asyncio client of EnvironmentServer. Observations are (event, done, reward, score, lives, key) tuples.
+        Requests may be sent concurrently from many tasks, they are pipelined on the one connection.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        # request id -> future of the response
+        self.pending = {}
+        self.next_request_id = 0
+        self.receiver = asyncio.ensure_future(self.receive_responses())
+
+    @classmethod
+    async def connect(cls, path=None, host='127.0.0.1', port=None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def receive_responses(self):
+        try:
+            while True:
+                length, = LENGTH_FORMAT.unpack(await self.reader.readexactly(LENGTH_FORMAT.size))
+                response = await self.reader.readexactly(length)
+                request_id, = REQUEST_ID_FORMAT.unpack_from(response)
+                future = self.pending.pop(request_id, None)
+                if future is not None and not future.cancelled():
+                    future.set_result(response[REQUEST_ID_FORMAT.size:])
+        except (asyncio.IncompleteReadError, ConnectionError) as error:
+            # Fail the requests that will never get a response
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection closed: %s" % error))
+            self.pending.clear()
+
+    async def request(self, payload):
+        if self.receiver.done():
+            raise ConnectionError("Connection closed")
+        request_id = self.next_request_id
+        self.next_request_id = (request_id + 1) % (1 << 32)
+        response = self.pending[request_id] = asyncio.get_running_loop().create_future()
+        self.writer.write(LENGTH_FORMAT.pack(REQUEST_ID_FORMAT.size + len(payload)) +
+                          REQUEST_ID_FORMAT.pack(request_id) + payload)
+        try:
+            response = await response
+        finally:
+            self.pending.pop(request_id, None)
+        if response[0] == STATUS_ERROR:
+            message_length, = COUNT_FORMAT.unpack_from(response, 1)
+            raise RequestError(response[3:3 + message_length].decode())
+        return response
+
+    async def open(self, level, seed=None):
+        """
+        Returns:
+            (environment id, observation)
+        """
+        flags = FLAG_SEED if seed is not None else 0
+        level = level.encode()
+        response = await self.request(bytes([OPEN]) + OPEN_FORMAT.pack(seed or 0, flags, len(level)) + level)
+        environment_id, = ENVIRONMENT_FORMAT.unpack_from(response, 1)
+        return environment_id, unpack_observation(response, 1 + ENVIRONMENT_FORMAT.size)[0]
+
+    async def reset(self, environment_id, seed=None):
+        flags = FLAG_SEED if seed is not None else 0
+        response = await self.request(bytes([RESET]) + RESET_FORMAT.pack(environment_id, flags, seed or 0))
+        return unpack_observation(response, 1)[0]
+
+    async def step(self, environment_id, move):
+        """
+        Args:
+            move: Action.value, or MOVE_NONE
+        """
+        response = await self.request(bytes([STEP]) + STEP_FORMAT.pack(environment_id, move))
+        return unpack_observation(response, 1)[0]
+
+    async def step_many(self, steps):
+        """
+        Args:
+            steps: list of (environment id, move)
+        Returns:
+            List of observations, in the order of steps
+        """
+        payload = [bytes([STEP_MANY]), COUNT_FORMAT.pack(len(steps))]
+        payload.extend(STEP_FORMAT.pack(environment_id, move) for environment_id, move in steps)
+        response = await self.request(b''.join(payload))
+        count, = COUNT_FORMAT.unpack_from(response, 1)
+        observations, offset = [], 1 + COUNT_FORMAT.size
+        for i in range(count):
+            observation, offset = unpack_observation(response, offset)
+            observations.append(observation)
+        return observations
+
+    async def close_environment(self, environment_id):
+        await self.request(bytes([CLOSE]) + ENVIRONMENT_FORMAT.pack(environment_id))
+
+    async def close(self):
+        self.receiver.cancel()
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def serve(path=None, host='127.0.0.1', port=0):
+    server = await EnvironmentServer().start(path, host, port)
+    print('Serving on', ', '.join(str(socket.getsockname()) for socket in server.sockets))
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve Pac-Man simulations over a local socket')
+    parser.add_argument('--unix', help='path of a Unix socket to listen on instead of TCP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    args = parser.parse_args()
+    asyncio.run(serve(args.unix, args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
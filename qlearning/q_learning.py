@@ -1,12 +1,14 @@
 import numpy as np
 
-from copy import deepcopy
+import os
 import random
+from concurrent.futures import ProcessPoolExecutor
 
 from pacman.actions import Action
-from pacman.game import Game
-from pacman.gamelogic import ActionEvent, get_next_game_state_from_action
-from utils.file_utils import save_pickle, load_pickle
+from pacman.gamelogic import ActionEvent
+from pacman.profiler import get_profiler, set_profiler
+from pacman.simulation import Simulation
+from qlearning.q_table import DenseQTable, MappedQTable, save_q_table
 
 
 def calculate_reward_for_move(action_event):
@@ -27,8 +29,8 @@ def calculate_reward_for_move(action_event):
 
 class QLearn(object):
 
-    def __init__(self):
-        self.q_table = {}
+    def __init__(self, q_table=None):
+        self.q_table = q_table if q_table is not None else DenseQTable()
 
     def pick_action(self, game_state):
         exploration_prob = 0.20
@@ -47,10 +49,7 @@ class QLearn(object):
           terminal state, you should return a value of 0.0.
         """
 
-        if state not in self.q_table:
-            self.q_table[state] = {key: 0.0 for key in Action.get_all_actions()}
-
-        return max(self.q_table[state].values())
+        return self.q_table.get_max_value(state)
 
     def pick_optimal_action(self, state, printing=False):
         """
@@ -59,56 +58,226 @@ class QLearn(object):
           you should return None.
         """
 
-        if state not in self.q_table:
-            self.q_table[state] = {key: 0.0 for key in Action.get_all_actions()}
-
-        max_value = max(self.q_table[state].values())
-        actions = [key for key in self.q_table[state] if self.q_table[state][key] == max_value]
+        actions = self.q_table.get_best_actions(state)
 
         if printing:
             print(state)
-            print(self.q_table[state])
+            print(self.q_table.get_values(state))
             print(state.__hash__())
 
         return random.choice(actions)
 
-    def train(self, level='level-0', num_episodes=10):
-        game = Game(level)
-        discount = 0.8
-        alpha = 0.2
-        score = 0
+    def run_episode(self, simulation, discount=0.8, alpha=0.2, replay_buffer=None, replay_batch_size=32):
+        """
+            Play one episode from the start of the level, updating the Q-table after every step
+        Args:
+            simulation (Simulation):
+            replay_buffer (ReplayBuffer): if given, every transition is stored in it and after every step the
+                Q-table is also updated from a batch of earlier transitions. Needs a DenseQTable
+            replay_batch_size: transitions replayed per step
 
-        for i in range(num_episodes):
-            current_game_state = deepcopy(game.initial_game_state)
-            print("Episode number ", i)
-            episode_done = False
-            while not episode_done:
+        Returns:
+            (GameState, ActionEvent, float): the final state, the event that ended the episode and the total reward
+        """
+        profiler = get_profiler()
+        current_game_state = simulation.reset()
+        score = 0
+        episode_done = False
+        while not episode_done:
+            with profiler.phase('pick_action'):
                 action = self.pick_action(current_game_state)
-                new_game_state, action_event = get_next_game_state_from_action(current_game_state, action.name)
+            with profiler.phase('step'):
+                new_game_state, action_event, episode_done = simulation.step(action.name)
+
+            reward = calculate_reward_for_move(action_event)
+            score += reward
+
+            with profiler.phase('q_update'):
+                # Nothing follows the last state of an episode, learn_from_replay does the same
+                max_next_q_value = 0 if episode_done else self.compute_max_q_value(new_game_state)
+                q_value = self.q_table.get_values(current_game_state)[action.value]
+                self.q_table.update(current_game_state, action, q_value + alpha * (reward + (discount * max_next_q_value) - q_value))
+
+            if replay_buffer is not None:
+                with profiler.phase('replay'):
+                    replay_buffer.add(self.q_table.get_row(current_game_state), action.value, reward,
+                                      self.q_table.get_row(new_game_state), episode_done)
+                    if len(replay_buffer) >= replay_batch_size:
+                        self.learn_from_replay(replay_buffer, replay_batch_size, discount, alpha)
+
+            current_game_state = new_game_state
+        profiler.count('episodes')
+        return current_game_state, action_event, score
+
+    def learn_from_replay(self, replay_buffer, batch_size, discount=0.8, alpha=0.2):
+        """
+            One Q-learning update of a whole batch of stored transitions, done with array operations
+        Args:
+            replay_buffer (ReplayBuffer):
+
+        Returns:
+            TD errors of the batch
+        """
+        indices, states, actions, rewards, next_states, dones, weights = replay_buffer.sample(batch_size)
+        max_next_q_values = np.where(dones, 0, self.q_table.get_max_values(next_states))
+        td_errors = rewards + discount * max_next_q_values - self.q_table.values[states, actions]
+        self.q_table.add_to_values(states, actions, alpha * weights * td_errors)
+        if replay_buffer.prioritized:
+            replay_buffer.update_priorities(indices, td_errors)
+        return td_errors
+
+    def train(self, level='level-0', num_episodes=10, profiler=None, replay_buffer=None, replay_batch_size=32,
+              transition_cache=None):
+        """
+        Args:
+            profiler (Profiler): if given, the phases of every training step are timed with it
+            replay_buffer (ReplayBuffer): if given, also learn from batches of earlier transitions, see run_episode
+            transition_cache (TransitionCache): if given, repeated transitions are not simulated again
+        """
+        simulation = Simulation(level, transition_cache=transition_cache)
+        score = 0
+        previous_profiler = set_profiler(profiler) if profiler is not None else None
+
+        try:
+            for i in range(num_episodes):
+                print("Episode number ", i)
+                current_game_state, action_event, episode_score = self.run_episode(
+                    simulation, replay_buffer=replay_buffer, replay_batch_size=replay_batch_size)
+                if action_event == ActionEvent.WON:
+                    print("Won!!")
+                elif action_event == ActionEvent.LOST:
+                    print("Lost!!")
+                score += episode_score
+                print("Score:", current_game_state.calculate_score())
+        finally:
+            if profiler is not None:
+                set_profiler(previous_profiler)
+        save_q_table('./q_table_map4', self.q_table, True)
+
+    def train_parallel(self, level='level-0', num_episodes=100, num_workers=None, episodes_per_update=10,
+                       merge='sum'):
+        """
+            Train on a pool of processes. Each worker gets the Q-table once, when it starts, plays episodes against
+            its own copy and sends back only the values it changed, which are merged into self.q_table after every
+            round. The next tasks carry the merged changes, which the workers apply to catch up with self.q_table.
+        Args:
+            num_workers: number of processes, defaults to the number of CPUs
+            episodes_per_update: episodes a worker plays before its updates are merged
+            merge: 'sum' adds up the changes of all workers, 'average' applies their mean
+        """
+        num_workers = num_workers or os.cpu_count()
+        episodes_started = 0
+        update_round = 0
+        # (round, merged changes) that some worker may not have applied yet
+        merged_updates = []
+        # pid -> the last round the worker has applied. A worker that has not reported yet is at round 0
+        worker_rounds = {}
+        # Workers may start after the first merge, so they get a copy of the table as it was at round 0
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=init_training_worker,
+                                 initargs=(self.q_table.copy(),)) as executor:
+            while episodes_started < num_episodes:
+                futures = []
+                for worker in range(num_workers):
+                    worker_episodes = min(episodes_per_update, num_episodes - episodes_started)
+                    if worker_episodes <= 0:
+                        break
+                    futures.append(executor.submit(run_training_episodes, level, worker_episodes,
+                                                   random.getrandbits(32), merged_updates))
+                    episodes_started += worker_episodes
+                results = [future.result() for future in futures]
+                for pid, worker_round, updates in results:
+                    worker_rounds[pid] = worker_round
+                update_round += 1
+                merged_updates.append((update_round,
+                                       merge_q_table_updates(self.q_table, [updates for _, _, updates in results],
+                                                             merge)))
+                # Only keep what a worker still has to apply
+                if len(worker_rounds) >= num_workers:
+                    oldest_round = min(worker_rounds.values())
+                    merged_updates = [(applied_round, updates) for applied_round, updates in merged_updates
+                                      if applied_round > oldest_round]
+                print("Episodes trained:", episodes_started)
+        save_q_table('./q_table_map4', self.q_table, True)
+
+
+# Q-table and simulations of a train_parallel worker process, see init_training_worker
+worker_q_table = None
+worker_round = 0
+worker_simulations = {}
 
-                if action_event == ActionEvent.WON or action_event == ActionEvent.LOST:
-                    episode_done = True
-                    if action_event == ActionEvent.WON:
-                        print("Won!!")
-                    elif action_event == ActionEvent.LOST:
-                        print("Lost!!")
-                reward = calculate_reward_for_move(action_event)
-                score += reward
 
-                if current_game_state not in self.q_table:
-                    self.q_table[current_game_state] = {key: 0.0 for key in Action.get_all_actions()}
+def init_training_worker(q_table):
+    global worker_q_table, worker_round
+    worker_q_table = q_table
+    worker_round = 0
+    worker_simulations.clear()
 
-                self.q_table[current_game_state][action] = self.q_table[current_game_state][action] + alpha * (reward + (discount * self.compute_max_q_value(new_game_state)) - self.q_table[current_game_state][action])
 
-                current_game_state = new_game_state
-            print("Score:", current_game_state.calculate_score())
-        save_pickle('./q_table_map4', self.q_table, True)
+def run_training_episodes(level, num_episodes, seed=None, merged_updates=()):
+    """
+        Task of a train_parallel worker: catch up with the merged changes of the rounds it missed, then play
+        episodes. The worker's own changes are undone again, they come back with the merged changes
+    Args:
+        merged_updates: list of (round, {encoded state: array of deltas per action})
+
+    Returns:
+        (pid, the last round applied, the changes made to the Q-table as {encoded state: array of deltas per action})
+    """
+    global worker_round
+    for update_round, updates in merged_updates:
+        if update_round > worker_round:
+            worker_q_table.add_deltas(updates)
+            worker_round = update_round
+
+    # Forked workers inherit the random state of the parent, so reseed to play different episodes
+    random.seed(seed)
+    np.random.seed(seed)
+    simulation = worker_simulations.get(level)
+    if simulation is None:
+        simulation = worker_simulations[level] = Simulation(level)
+    q_model = QLearn(worker_q_table)
+    worker_q_table.record_changes()
+    for i in range(num_episodes):
+        q_model.run_episode(simulation)
+    return os.getpid(), worker_round, worker_q_table.take_changes()
+
+
+def merge_q_table_updates(q_table, updates, merge='sum'):
+    """
+        Apply the updates returned by several workers to q_table
+    Args:
+        q_table (DenseQTable):
+        updates: list of {encoded state: array of deltas per action}
+        merge: 'sum' or 'average'
+
+    Returns:
+        The changes that were applied, as {encoded state: array of deltas per action}
+    """
+    if merge not in ('sum', 'average'):
+        raise ValueError("Unknown merge strategy: " + merge)
+
+    deltas = {}
+    for worker_updates in updates:
+        for key, delta in worker_updates.items():
+            deltas.setdefault(key, []).append(delta)
+
+    merged = {}
+    for key, state_deltas in deltas.items():
+        if merge == 'sum':
+            merged[key] = np.sum(state_deltas, axis=0)
+        else:
+            # Average over the workers that changed the action, not over all workers
+            changed = np.count_nonzero(state_deltas, axis=0)
+            merged[key] = np.sum(state_deltas, axis=0) / np.maximum(changed, 1)
+    q_table.add_deltas(merged)
+    return merged
 
 
-def run_with_game_loop(level='level-0', model_path='./q_table.pkl'):
+def run_with_game_loop(level='level-0', model_path='./q_table'):
+    # Imported here so that training does not depend on pygame
+    from pacman.game import Game
 
-    q_model = QLearn()
-    q_model.q_table = load_pickle(model_path)
+    q_model = QLearn(MappedQTable(model_path))
 
     def ai_func(current_game_state):
         return q_model.pick_optimal_action(current_game_state)
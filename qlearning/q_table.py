@@ -0,0 +1,261 @@
+import argparse
+import pickle
+
+import numpy as np
+
+from pacman.actions import Action
+from pacman.initializer import read_level
+
+
+KEYS_FILE_SUFFIX = '.keys.npy'
+VALUES_FILE_SUFFIX = '.values.npy'
+
+
+class QTable:
+    """
+        Lookups shared by the Q-table backends. Subclasses provide get_values
+    """
+
+    def get_values(self, state):
+        raise NotImplementedError
+
+    def get_max_value(self, state):
+        return float(self.get_values(state).max())
+
+    def get_best_actions(self, state):
+        values = self.get_values(state)
+        return [Action(value) for value in np.flatnonzero(values == values.max())]
+
+
+class DenseQTable(QTable):
+    """
+        Q-table that stores its values in one growable float32 array with a row per state and a column per Action.
+        States are looked up by GameState.encode_key, so the table never keeps game states alive.
+    """
+
+    def __init__(self, capacity=1024):
+        # encoded state key -> row in self.values, and the key of every row
+        self.index = {}
+        self.keys = []
+        self.values = np.zeros((capacity, len(Action)), dtype=np.float32)
+        # row -> its values before it first changed, while changes are recorded, see record_changes
+        self.journal = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, state):
+        return state.encode_key() in self.index
+
+    def __getstate__(self):
+        # Do not pickle the unused capacity
+        return {'index': self.index, 'keys': self.keys, 'values': self.values[:len(self.index)]}
+
+    def __setstate__(self, state):
+        self.index = state['index']
+        self.keys = state['keys']
+        self.values = state['values']
+        self.journal = None
+
+    def copy(self):
+        table = DenseQTable.__new__(DenseQTable)
+        table.index = dict(self.index)
+        table.keys = list(self.keys)
+        table.values = self.values.copy()
+        table.journal = None
+        return table
+
+    def get_row_for_key(self, key):
+        """
+            Row of an encoded state, adding a row of zeros if the state is new
+        """
+        row = self.index.get(key)
+        if row is None:
+            row = len(self.index)
+            if row == len(self.values):
+                self.grow()
+            self.index[key] = row
+            self.keys.append(key)
+        return row
+
+    def get_row(self, state):
+        return self.get_row_for_key(state.encode_key())
+
+    def grow(self):
+        values = np.zeros((max(2 * len(self.values), 1), len(Action)), dtype=np.float32)
+        values[:len(self.values)] = self.values
+        self.values = values
+
+    def get_values(self, state):
+        """
+            Q-values of a state, indexed by Action.value
+        """
+        row = self.get_row(state)
+        return self.values[row]
+
+    def update(self, state, action, value):
+        row = self.get_row(state)
+        if self.journal is not None and row not in self.journal:
+            self.journal[row] = self.values[row].copy()
+        self.values[row, action.value] = value
+
+    def get_max_values(self, rows):
+        return self.values[rows].max(axis=1)
+
+    def add_to_values(self, rows, actions, deltas):
+        """
+            Add deltas to the values of many (row, action) pairs at once. Repeated pairs get the sum of their deltas
+        """
+        if self.journal is not None:
+            for row in np.unique(rows).tolist():
+                if row not in self.journal:
+                    self.journal[row] = self.values[row].copy()
+        np.add.at(self.values, (rows, actions), deltas)
+
+    def add_deltas(self, deltas):
+        """
+        Args:
+            deltas: {encoded key: array of deltas per action}, rows are added for new keys
+        """
+        for key, delta in deltas.items():
+            # Looked up first, adding the row may replace self.values
+            row = self.get_row_for_key(key)
+            self.values[row] += delta
+
+    def record_changes(self):
+        """
+            Start remembering the values of every row before its first change, so take_changes only has to look at
+            the rows that changed instead of the whole table
+        """
+        self.journal = {}
+
+    def take_changes(self):
+        """
+            Undo the changes made since record_changes and stop recording
+        Returns:
+            The changes, as {encoded key: array of deltas per action}
+        """
+        deltas = {}
+        for row, original in self.journal.items():
+            delta = self.values[row] - original
+            if delta.any():
+                deltas[self.keys[row]] = delta
+            self.values[row] = original
+        self.journal = None
+        return deltas
+
+
+class MappedQTable(QTable):
+    """
+        Read-only Q-table opened from the files written by save_q_table. Both files are memory-mapped, so opening
+        it is instant, only the pages of the states that are looked up are read, and processes that open the same
+        table share those pages. States that are not in the table have Q-values of zero.
+    """
+
+    def __init__(self, file_path_without_extension):
+        # Keys are sorted, so a lookup is a binary search over the mapped keys
+        self.keys = np.load(file_path_without_extension + KEYS_FILE_SUFFIX, mmap_mode='r')
+        self.values = np.load(file_path_without_extension + VALUES_FILE_SUFFIX, mmap_mode='r')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, state):
+        return self.find_row(state.encode_key()) is not None
+
+    def find_row(self, key):
+        row = np.searchsorted(self.keys, key)
+        # numpy drops trailing zero bytes of fixed-width byte strings
+        if row < len(self.keys) and self.keys[row] == key.rstrip(b'\x00'):
+            return int(row)
+        return None
+
+    def get_values(self, state):
+        row = self.find_row(state.encode_key())
+        if row is None:
+            return np.zeros(len(Action), dtype=np.float32)
+        return self.values[row]
+
+    def to_dense(self):
+        """
+            Load the whole table into a DenseQTable, e.g. to continue training it
+        """
+        table = DenseQTable(max(len(self), 1))
+        table.values[:len(self)] = self.values
+        table.keys = [bytes(key).ljust(self.keys.dtype.itemsize, b'\x00') for key in self.keys]
+        table.index = {key: row for row, key in enumerate(table.keys)}
+        return table
+
+
+def save_q_table(file_path_without_extension, q_table, feedback=True):
+    """
+        Save a DenseQTable as a sorted key index and a value array that MappedQTable can memory-map
+    :param file_path_without_extension: path of save location, the file suffixes are added
+    :param q_table: DenseQTable to save
+    """
+    key_length = max((len(key) for key in q_table.index), default=1)
+    keys = np.array(list(q_table.index), dtype='S%d' % key_length)
+    rows = np.fromiter(q_table.index.values(), dtype=np.int64, count=len(q_table.index))
+    order = np.argsort(keys, kind='stable')
+    np.save(file_path_without_extension + KEYS_FILE_SUFFIX, keys[order])
+    np.save(file_path_without_extension + VALUES_FILE_SUFFIX, q_table.values[rows[order]])
+
+    if feedback:
+        print('Done saving Q-table %s' % file_path_without_extension)
+
+
+class PickledGameState:
+    """
+        Stand-in for the GameState objects of a pickled Q-table. Their attributes predate the current GameState, so
+        they are only read for their positions, see convert_pickled_q_table
+    """
+
+
+class PickledQTableUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if (module, name) == ('pacman.gamestate', 'GameState'):
+            return PickledGameState
+        return super().find_class(module, name)
+
+
+def convert_pickled_q_table(pickle_path, level):
+    """
+        Read a Q-table in the old pickle format, a dict of GameState -> {Action: value}, into a DenseQTable
+    Args:
+        pickle_path: the .pkl file
+        level: the board the table was trained on, to number its dots the way GameState.encode_key does
+
+    Returns:
+        DenseQTable
+    """
+    with open(pickle_path, 'rb') as f:
+        pickled_table = PickledQTableUnpickler(f).load()
+
+    game_state = read_level(level)
+    table = DenseQTable(max(len(pickled_table), 1))
+    for pickled_state, action_values in pickled_table.items():
+        state = game_state.get_successor()
+        state.pacman.position = pickled_state.pacman.position
+        for ghost, pickled_ghost in zip(state.ghosts, pickled_state.ghosts):
+            ghost.position = pickled_ghost.position
+        state.dot_mask = 0
+        for dot in pickled_state.dots:
+            if not dot.is_eaten:
+                state.dot_mask |= 1 << state.dot_bits[dot.position]
+        row = table.get_row(state)
+        for action, value in action_values.items():
+            table.values[row, action.value] = value
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a pickled Q-table to the format of save_q_table')
+    parser.add_argument('pickle_path', help='the .pkl file of the Q-table')
+    parser.add_argument('level', help='the board the Q-table was trained on, e.g. level-4')
+    parser.add_argument('output', help='path of the converted Q-table, without the file suffixes')
+    args = parser.parse_args()
+    save_q_table(args.output, convert_pickled_q_table(args.pickle_path, args.level))
+
+
+if __name__ == '__main__':
+    main()
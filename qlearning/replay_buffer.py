@@ -0,0 +1,113 @@
+import numpy as np
+
+REPLAY_CAPACITY = 100000
+# Keeps transitions with a TD error of zero in the prioritized sample
+MIN_PRIORITY = 1e-3
+
+
+class ReplayBuffer:
+    """
+        Fixed-size store of the last transitions, kept in preallocated arrays that are overwritten as a ring.
+        States are stored as their row in a DenseQTable, so a whole sample can be looked up with fancy indexing.
+
+        With prioritized=True transitions are sampled in proportion to their last TD error to the power of
+        priority_exponent, and sample returns importance weights that correct the bias this brings. The priorities
+        are kept in a sum tree, so sampling and updating them take O(log capacity) per transition.
+    """
+
+    def __init__(self, capacity=REPLAY_CAPACITY, prioritized=False, priority_exponent=0.6, importance_exponent=0.4,
+                 seed=None):
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.priority_exponent = priority_exponent
+        self.importance_exponent = importance_exponent
+        self.random = np.random.default_rng(seed)
+
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+        # Sum tree of the priorities to the power of priority_exponent: node i is the sum of nodes 2i and 2i + 1,
+        # the leaves start at self.first_leaf and node 1 holds the total
+        self.depth = max(capacity - 1, 0).bit_length()
+        self.first_leaf = 1 << self.depth
+        self.tree = np.zeros(2 * self.first_leaf, dtype=np.float64)
+        self.max_priority = 1.0
+        # Slot of the next transition and number of slots in use
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        """
+            Store a transition, overwriting the oldest one when the buffer is full
+        Args:
+            state, next_state: rows of the states in the Q-table
+            action: Action.value
+        """
+        position = self.position
+        self.states[position] = state
+        self.actions[position] = action
+        self.rewards[position] = reward
+        self.next_states[position] = next_state
+        self.dones[position] = done
+        if self.prioritized:
+            # New transitions are sampled at least once before their error is known
+            node = self.first_leaf + position
+            self.tree[node] = self.max_priority ** self.priority_exponent
+            while node > 1:
+                node //= 2
+                self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+        self.position = (position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size):
+        """
+            Draw a batch of transitions, with replacement
+        Returns:
+            (indices, states, actions, rewards, next_states, dones, weights): weights are all one unless the
+            buffer is prioritized
+        """
+        if self.prioritized:
+            indices = self.find_prefix_sums(self.random.random(batch_size) * self.tree[1])
+            probabilities = self.tree[self.first_leaf + indices] / self.tree[1]
+            weights = (self.size * probabilities) ** -self.importance_exponent
+            weights /= weights.max()
+        else:
+            indices = self.random.integers(self.size, size=batch_size)
+            weights = np.ones(batch_size, dtype=np.float32)
+        return (indices, self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices], weights.astype(np.float32))
+
+    def find_prefix_sums(self, targets):
+        """
+            Walk down the sum tree for a whole batch at once
+        Returns:
+            For every target, the slot whose range of cumulative priority contains it
+        """
+        nodes = np.ones(len(targets), dtype=np.int64)
+        targets = targets.copy()
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sums = self.tree[left]
+            go_right = targets >= left_sums
+            targets -= np.where(go_right, left_sums, 0)
+            nodes = left + go_right
+        # Rounding can step past the last slot in use
+        return np.minimum(nodes - self.first_leaf, self.size - 1)
+
+    def set_priorities(self, indices, priorities):
+        nodes = self.first_leaf + indices
+        self.tree[nodes] = priorities ** self.priority_exponent
+        # All leaves are at the same depth, so every step up is one level of the tree
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(td_errors) + MIN_PRIORITY
+        self.set_priorities(indices, priorities)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
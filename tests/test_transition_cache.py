@@ -0,0 +1,90 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import pacman.board_compiler as board_compiler
+from objects.ghost import SCATTER
+from pacman.gamelogic import get_next_game_state_from_action
+from pacman.initializer import read_level
+from pacman.simulation import Simulation
+from pacman.transition_cache import TransitionCache
+
+MOVES = ["UP", "RIGHT", "DOWN", "LEFT", "NONE"]
+# Pac-Man starts right of the ghost
+CAPTURE_BOARD = """%%%%%%%
+%.....%
+%.GP..%
+%.....%
+%%%%%%%
+"""
+
+
+def get_snapshot(game_state):
+    """
+        Everything a step may change, to compare states built by the cache with simulated ones
+    """
+    pacman = game_state.pacman
+    return (game_state.get_key(), game_state.zobrist_hash, game_state.num_dots_left, game_state.eaten_dot_score,
+            game_state.last_game_event, pacman.lives, pacman.current_move, pacman.previous_position,
+            pacman.number_of_ticks,
+            [(ghost.previous_position, ghost.previous_move, ghost.mode, ghost.target_position,
+              ghost.ticks_since_respawn) for ghost in game_state.ghosts])
+
+
+class TransitionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        # Keep compiled boards out of the user's cache
+        patcher = mock.patch.object(board_compiler, 'CACHE_DIRECTORY', os.path.join(self.directory, 'cache'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_capture_restarts_the_ghost_clock(self):
+        board_path = os.path.join(self.directory, 'capture.txt')
+        with open(board_path, 'w') as f:
+            f.write(CAPTURE_BOARD)
+        initial_game_state = read_level(board_path)
+
+        def make_game_state(ticks_since_respawn):
+            # Both states are in the first scatter phase, so they share a dynamics key
+            game_state = initial_game_state.get_successor()
+            ghost = game_state.ghosts[0]
+            ghost.mode = SCATTER
+            ghost.previous_move = "UP"
+            ghost.target_position = (0, 0)
+            ghost.ticks_since_respawn = ticks_since_respawn
+            return game_state
+
+        cache = TransitionCache()
+        cache.step(make_game_state(0), "LEFT")
+        cached_game_state, cached_event = cache.step(make_game_state(5), "LEFT")
+        game_state, action_event = get_next_game_state_from_action(make_game_state(5), "LEFT")
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cached_event, action_event)
+        self.assertEqual(get_snapshot(cached_game_state), get_snapshot(game_state))
+
+    def test_cached_steps_match_simulated_steps(self):
+        for level in ['level-0', 'level-1']:
+            cache = TransitionCache()
+            simulations = [Simulation(level), Simulation(level, transition_cache=cache)]
+            for episode in range(20):
+                for simulation in simulations:
+                    simulation.reset(seed=episode)
+                rng = random.Random(episode)
+                episode_done = False
+                while not episode_done:
+                    move = rng.choice(MOVES)
+                    (game_state, action_event, episode_done), (cached_game_state, cached_event, cached_done) = [
+                        simulation.step(move) for simulation in simulations]
+                    self.assertEqual(get_snapshot(cached_game_state), get_snapshot(game_state))
+                    self.assertEqual((cached_event, cached_done), (action_event, episode_done))
+            self.assertGreater(cache.hits, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,11 @@ import os
 
 # NB: use lower case file names to ensure it will work on all OS
 
+IMAGE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'images')
+ROTATIONS = (0, 90, 180, 270)
+
 _image_library = {}
+_atlas = None
 
 
 def get_image(path, force_reload=False):
@@ -14,3 +18,56 @@ def get_image(path, force_reload=False):
         image = pygame.image.load(canonicalized_path)
         _image_library[path] = image
     return image
+
+
+class SpriteAtlas:
+    """
+        Every image of a directory, loaded once together with its horizontally flipped and rotated variants.
+        Once a display mode is set the surfaces are converted to the display's pixel format, which makes
+        blitting them much faster.
+    """
+
+    def __init__(self, directory=IMAGE_DIRECTORY):
+        self.directory = directory
+        self.converted = pygame.display.get_surface() is not None
+        # (file name, flipped, rotation in degrees counterclockwise) -> Surface
+        self.sprites = {}
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith('.png'):
+                self.add_image(name)
+
+    def add_image(self, name):
+        image = pygame.image.load(os.path.join(self.directory, name))
+        if self.converted:
+            image = image.convert_alpha()
+        for flipped in (False, True):
+            variant = pygame.transform.flip(image, True, False) if flipped else image
+            for rotation in ROTATIONS:
+                self.sprites[name, flipped, rotation] = pygame.transform.rotate(variant, rotation) if rotation else variant
+
+    def get_sprite(self, name, flipped=False, rotation=0):
+        sprite = self.sprites.get((name, flipped, rotation))
+        if sprite is None:
+            # An image that was not in the directory when the atlas was loaded
+            self.add_image(name)
+            sprite = self.sprites[name, flipped, rotation]
+        return sprite
+
+
+def get_atlas():
+    """
+        The shared SpriteAtlas. It is loaded again once if it was first loaded before the display was set up,
+        so its surfaces can be converted to the display format.
+    """
+    global _atlas
+    if _atlas is None or (not _atlas.converted and pygame.display.get_surface() is not None):
+        _atlas = SpriteAtlas()
+    return _atlas
+
+
+def get_sprite(name, flipped=False, rotation=0):
+    """
+        Image from the images directory by file name, e.g. 'ghost.png', mirrored and/or rotated by a multiple of
+        90 degrees
+    """
+    return get_atlas().get_sprite(name, flipped, rotation)